@@ -0,0 +1,415 @@
+"""Benchmarks for the request dispatch hot path of ``sanic-boom``.
+
+Everything runs offline: requests are created in memory and handed straight
+to ``SanicBoom.handle_request`` (no server, no sockets). Besides the full
+dispatch, each stage is also measured on its own:
+
+* ``router``: ``BoomRouter.get``
+* ``resolve``: ``Resolver.resolve`` for the route handler
+* ``cache_engine``: ``CacheEngine.get`` for the first component of the handler
+* ``handle_request``: the whole thing, middlewares and handler included
+
+Usage::
+
+    python benchmarks/bench_dispatch.py
+    python benchmarks/bench_dispatch.py --json before.json
+    python benchmarks/bench_dispatch.py --compare before.json
+
+When comparing, the exit code is 1 if any stage got slower than the given
+threshold (10% by default), so it can be used to catch regressions.
+"""
+
+import argparse
+import asyncio
+import inspect
+import json
+import logging
+import platform
+import sys
+import time
+import uuid
+
+import sanic
+from sanic.response import text
+
+from sanic_boom import (
+    BoomRequest,
+    Component,
+    ComponentCache,
+    SanicBoom,
+    __version__ as boom_version,
+)
+
+# --------------------------------------------------------------------------- #
+# components
+# --------------------------------------------------------------------------- #
+
+
+class Lifecycle:
+    def __init__(self, lifecycle):
+        self.lifecycle = lifecycle
+
+    def __repr__(self):
+        return "Lifecycle({})".format(self.lifecycle.name)
+
+
+LIFECYCLES = {lifecycle: Lifecycle(lifecycle) for lifecycle in ComponentCache}
+
+
+def lifecycle_component(lifecycle):
+    class LifecycleComponent(Component):
+        def resolve(self, param: inspect.Parameter) -> bool:
+            return param.annotation is LIFECYCLES[lifecycle]
+
+        async def get(self, request, param: inspect.Parameter):
+            return str(uuid.uuid4())
+
+        def get_cache_lifecycle(self):
+            return lifecycle
+
+    LifecycleComponent.__name__ = "{}Component".format(lifecycle.name.title())
+    return LifecycleComponent
+
+
+class Tracker:
+    pass
+
+
+class User:
+    pass
+
+
+class TrackerComponent(Component):
+    def resolve(self, param: inspect.Parameter) -> bool:
+        return param.annotation is Tracker or param.name == "tracker"
+
+    async def get(self, request):
+        return str(uuid.uuid4())
+
+    def get_cache_lifecycle(self):
+        return ComponentCache.REQUEST
+
+
+class UserComponent(Component):
+    def resolve(self, param: inspect.Parameter) -> bool:
+        return param.annotation is User
+
+    async def get(self, request, tracker):
+        return {"name": "boom", "tracker": tracker}
+
+
+# --------------------------------------------------------------------------- #
+# scenarios
+# --------------------------------------------------------------------------- #
+
+
+def static_app():
+    app = SanicBoom("static")
+
+    @app.get("/ping")
+    async def handler(request):
+        return text("pong")
+
+    return app, "/ping"
+
+
+def params_app():
+    app = SanicBoom("params")
+
+    @app.get("/users/:user_id/posts/:post_id")
+    async def handler(request, user_id: int, post_id: int):
+        return text("OK")
+
+    return app, "/users/42/posts/7"
+
+
+def layered_app(depth=10):
+    app = SanicBoom("layered")
+    uri = ""
+
+    for i in range(depth):
+        uri += "/l{}".format(i)
+
+        async def request_middleware(request):
+            pass
+
+        async def response_middleware(request, response):
+            pass
+
+        app.register_middleware(request_middleware, "request", uri=uri)
+        app.register_middleware(response_middleware, "response", uri=uri)
+
+    @app.get(uri + "/handler")
+    async def handler(request):
+        return text("OK")
+
+    return app, uri + "/handler"
+
+
+def components_app():
+    app = SanicBoom("components")
+    app.add_component(TrackerComponent)
+    app.add_component(UserComponent)
+    for lifecycle in ComponentCache:
+        app.add_component(lifecycle_component(lifecycle))
+
+    no_cache = LIFECYCLES[ComponentCache.NO_CACHE]
+
+    @app.get("/components")
+    async def handler(
+        user: User,
+        tracker: Tracker,
+        a: no_cache,
+        b: no_cache,
+        c: no_cache,
+        d: no_cache,
+    ):
+        return text("OK")
+
+    return app, "/components"
+
+
+def lifecycle_app(lifecycle):
+    def factory():
+        app = SanicBoom("lifecycle_{}".format(lifecycle.name.lower()))
+        app.add_component(lifecycle_component(lifecycle))
+        annotation = LIFECYCLES[lifecycle]
+
+        async def handler(a, b, c, d):
+            return text("OK")
+
+        handler.__annotations__ = {
+            name: annotation for name in ("a", "b", "c", "d")
+        }
+        app.route("/lifecycle")(handler)
+        return app, "/lifecycle"
+
+    return factory
+
+
+SCENARIOS = {
+    "static": static_app,
+    "params": params_app,
+    "layered": layered_app,
+    "components": components_app,
+}
+SCENARIOS.update(
+    {
+        "lifecycle_{}".format(lifecycle.name.lower()): lifecycle_app(lifecycle)
+        for lifecycle in ComponentCache
+    }
+)
+
+# --------------------------------------------------------------------------- #
+# measuring
+# --------------------------------------------------------------------------- #
+
+
+def make_request(app, path):
+    request = BoomRequest(
+        url_bytes=path.encode(),
+        headers={},
+        version="1.1",
+        method="GET",
+        transport=None,
+    )
+    request.app = app
+    return request
+
+
+def summarize(timings):
+    timings = sorted(timings)
+    count = len(timings)
+    return {
+        "mean_us": sum(timings) / count * 1e6,
+        "p50_us": timings[count // 2] * 1e6,
+        "p99_us": timings[min(count - 1, int(count * 0.99))] * 1e6,
+    }
+
+
+async def measure(app, path, iterations):
+    requests = [make_request(app, path) for _ in range(iterations)]
+    stages = {}
+    responses = []
+
+    def write_callback(response):
+        responses.append(response)
+
+    async def stream_callback(response):
+        responses.append(response)
+
+    # ------------------------------------------------------------------- #
+    # router
+    timings = []
+    for request in requests:
+        started = time.perf_counter()
+        app.router.get(request)
+        timings.append(time.perf_counter() - started)
+    stages["router"] = summarize(timings)
+
+    chain, params = app.router.get(requests[0])
+    plan = app.resolver.get_plan(chain.handler)
+    component_slots = [slot for branch in plan.branches for slot in branch]
+
+    # ------------------------------------------------------------------- #
+    # resolver (fresh requests, so REQUEST cached components are evaluated)
+    timings = []
+    for request in [make_request(app, path) for _ in range(iterations)]:
+        started = time.perf_counter()
+        await app.resolver.resolve(
+            request=request, func=chain.handler, prefetched=params
+        )
+        timings.append(time.perf_counter() - started)
+    stages["resolve"] = summarize(timings)
+
+    # ------------------------------------------------------------------- #
+    # cache engine
+    if component_slots:
+        slot = component_slots[0]
+        timings = []
+        for request in [make_request(app, path) for _ in range(iterations)]:
+            started = time.perf_counter()
+            await app.cache_engine.get(
+                slot.component, chain.handler, request, slot.param
+            )
+            timings.append(time.perf_counter() - started)
+        stages["cache_engine"] = summarize(timings)
+
+    # ------------------------------------------------------------------- #
+    # the whole request
+    timings = []
+    for request in requests:
+        started = time.perf_counter()
+        await app.handle_request(request, write_callback, stream_callback)
+        timings.append(time.perf_counter() - started)
+    stages["handle_request"] = summarize(timings)
+
+    assert all(response.status == 200 for response in responses), path
+
+    return {"rps": 1e6 / stages["handle_request"]["mean_us"], "stages": stages}
+
+
+def run(scenarios, iterations, warmup):
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    results = {}
+
+    for name in scenarios:
+        app, path = SCENARIOS[name]()
+        app.finalize()
+        app.cache_engine.start_worker(loop)
+        loop.run_until_complete(app.warm_up())
+
+        if warmup:
+            loop.run_until_complete(measure(app, path, warmup))
+        results[name] = loop.run_until_complete(measure(app, path, iterations))
+        app.cache_engine.stop_worker()
+
+    loop.close()
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "sanic": sanic.__version__,
+            "sanic_boom": boom_version,
+            "iterations": iterations,
+        },
+        "results": results,
+    }
+
+
+# --------------------------------------------------------------------------- #
+# reporting
+# --------------------------------------------------------------------------- #
+
+STAGES = ("router", "resolve", "cache_engine", "handle_request")
+
+
+def report(data, baseline=None, threshold=0.1):
+    regressions = []
+    header = "{:<26} {:>10} {:>12} {:>12} {:>12} {:>14}".format(
+        "scenario", "req/s", *["{} (us)".format(s[:8]) for s in STAGES]
+    )
+    print(header)
+    print("-" * len(header))
+
+    for name, result in data["results"].items():
+        cells = []
+        for stage in STAGES:
+            value = result["stages"].get(stage)
+            if value is None:
+                cells.append("-")
+                continue
+            cell = "{:.2f}".format(value["mean_us"])
+            old = (
+                (baseline or {})
+                .get("results", {})
+                .get(name, {})
+                .get("stages", {})
+                .get(stage)
+            )
+            if old is not None:
+                delta = value["mean_us"] / old["mean_us"] - 1
+                cell += " ({:+.0%})".format(delta)
+                if delta > threshold:
+                    regressions.append((name, stage, delta))
+            cells.append(cell)
+        print(
+            "{:<26} {:>10.0f} {:>12} {:>12} {:>12} {:>14}".format(
+                name, result["rps"], *cells
+            )
+        )
+
+    for name, stage, delta in regressions:
+        print(
+            "REGRESSION: {} / {} is {:.0%} slower".format(name, stage, delta),
+            file=sys.stderr,
+        )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "scenarios",
+        nargs="*",
+        metavar="scenario",
+        help="scenarios to run, all by default: {}".format(
+            ", ".join(SCENARIOS)
+        ),
+    )
+    parser.add_argument("-n", "--iterations", type=int, default=5000)
+    parser.add_argument("-w", "--warmup", type=int, default=500)
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--compare", help="compare with a previous --json")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="slowdown ratio considered a regression (default: 0.1)",
+    )
+    args = parser.parse_args(argv)
+
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error("unknown scenarios: {}".format(", ".join(unknown)))
+
+    logging.disable(logging.WARNING)
+    data = run(args.scenarios or list(SCENARIOS), args.iterations, args.warmup)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    regressions = report(data, baseline, args.threshold)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
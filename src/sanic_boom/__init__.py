@@ -4,8 +4,9 @@ import logging
 
 from .app import SanicBoom
 from .cache import CacheEngine
-from .component import Component, ComponentCache
-from .request import BoomRequest
+from .component import Component, ComponentCache, MatchKeys
+from .http_cache import ResponseCache
+from .request import BoomRequest, RequestStream
 from .resolver import Resolver
 from .router import BoomRouter
 from .utils import param_parser
@@ -18,7 +19,10 @@ __all__ = (
     "CacheEngine",
     "Component",
     "ComponentCache",
+    "MatchKeys",
     "param_parser",
+    "RequestStream",
+    "ResponseCache",
     "Resolver",
     "SanicBoom",
 )
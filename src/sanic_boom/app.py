@@ -1,3 +1,4 @@
+import gc
 import re
 import warnings
 from asyncio import CancelledError
@@ -7,19 +8,32 @@ from urllib.parse import urlencode, urlunparse
 
 from sanic import Sanic
 from sanic.constants import HTTP_METHODS
-from sanic.exceptions import SanicException, URLBuildError
-from sanic.log import error_logger
+from sanic.exceptions import (
+    MethodNotSupported,
+    NotFound,
+    SanicException,
+    URLBuildError,
+)
+from sanic.handlers import ErrorHandler
+from sanic.log import error_logger, logger
 from sanic.response import HTTPResponse, StreamingHTTPResponse
+from sanic.router import ROUTER_CACHE_SIZE
 
 from sanic_boom.cache import CacheEngine
-from sanic_boom.component import Component
+from sanic_boom.component import Component, ComponentCache
+from sanic_boom.exceptions import RouterFrozen, UnresolvedParameters
+from sanic_boom.instrumentation import MemorySink, StageTimer
+from sanic_boom.proxies import ProxyConfig
 from sanic_boom.references import DOC_LINKS as dl
 from sanic_boom.request import BoomRequest
-from sanic_boom.resolver import Resolver
-from sanic_boom.router import BoomRouter
-from sanic_boom.utils import param_parser
+from sanic_boom.resolver import Resolver, SlotKind
+from sanic_boom.router import BoomRouter, RouteMiss
+from sanic_boom.utils import is_set, param_parser
 from sanic_boom.wrappers import MiddlewareType
 
+# characters that may break an URL if used as a parameter value
+_INVALID_URL_VALUE = re.compile(r"[:|*]").search
+
 
 class SanicBoom(Sanic):
     def __init__(self, *args, **kwargs):
@@ -37,13 +51,274 @@ class SanicBoom(Sanic):
         self.param_parser = param_parser_callable
         self.resolver = resolver_cls(self)
         self.cache_engine = cache_engine_cls(self)
+        self.instrumentation = None
+        # see _prebuilt_miss
+        self._prebuilt_misses = frozenset()
+        self._prebuilt_for = None
+        self.proxy_config = None
 
         for component in components:
             self.add_component(component)
 
+        self.register_listener(
+            self._before_server_start, "before_server_start"
+        )
+        self.register_listener(self._after_server_stop, "after_server_stop")
+
+    def _sync_global_middlewares(self):
+        self.router.set_global_middlewares(
+            self.request_middleware, self.response_middleware
+        )
+
+    async def _before_server_start(self, app, loop):
+        self.finalize()
+        self.cache_engine.start_worker(loop)
+        await self.warm_up()
+
+    def _prebuilt_miss(self, status):
+        """Whether unrouted requests of ``status`` may get a prebuilt
+        response: only if the app has no error handler of its own for them
+        and isn't in debug mode. The handlers may be added at any time, so
+        this is checked on every miss (recomputed only if they changed)."""
+        if self.debug:
+            return False
+        error_handler = self.error_handler
+        if type(error_handler) is not ErrorHandler:
+            return False
+        handlers = error_handler.handlers
+        if self._prebuilt_for != (error_handler, len(handlers)):
+            self._prebuilt_for = (error_handler, len(handlers))
+            self._prebuilt_misses = frozenset(
+                status
+                for status, error in (
+                    (404, NotFound),
+                    (405, MethodNotSupported),
+                )
+                if not any(
+                    issubclass(error, exception) for exception, _ in handlers
+                )
+            )
+        return status in self._prebuilt_misses
+
+    def _after_server_stop(self, app, loop):
+        self.cache_engine.stop_worker()
+
+    def finalize(self):
+        """Precompiles everything the request path needs (route chains,
+        injection plans and component lookups) and freezes the router. This
+        is called right before the server starts, but it is safe to call it
+        more than once.
+
+        :raises UnresolvedParameters: if any handler, middleware or component
+            requires a parameter that can not be resolved (including a
+            :class:`RequestStream` outside of the routes registered with
+            ``stream=True``)
+        :return: a summary of what was built
+        """
+        # "global" middlewares may be added straight to the deques (the Sanic
+        # test client does it), so they must be synced right before starting,
+        # and checked again with everything else
+        self.router.frozen = False
+        self._sync_global_middlewares()
+        self.router.set_cache_size(
+            self.config.get("BOOM_ROUTER_CACHE_SIZE", ROUTER_CACHE_SIZE)
+        )
+        self.resolver.set_cache_size(
+            self.config.get("BOOM_RESOLVER_CACHE_SIZE", 768)
+        )
+        self.cache_engine.configure(self.config)
+        chains = self.router.build_chains()
+        unresolved = []
+
+        def check(func, provided=(), stream=None):
+            plan = self.resolver.get_plan(func)
+            where = getattr(func, "__qualname__", repr(func))
+            for slot in plan.slots:
+                if (
+                    slot.kind is SlotKind.UNRESOLVED
+                    and slot.name not in provided
+                ):
+                    unresolved.append((where, slot.name))
+                # components may be used by any route, so they are only
+                # checked when resolved (stream is None)
+                elif slot.kind is SlotKind.STREAM and stream is False:
+                    unresolved.append(
+                        ("{} (not a stream route)".format(where), slot.name)
+                    )
+
+        for (route, _), chain in chains.items():
+            stream = hasattr(chain.handler, "is_stream")
+            check(chain.handler, route.params, stream)
+            for middleware in chain.request_middlewares:
+                check(middleware, stream=stream)
+            for middleware in chain.response_middlewares:
+                check(middleware, ("response",), stream)
+
+        # they also run for requests that could not be routed
+        for middleware in self.router.request_middleware:
+            check(middleware, stream=False)
+        for middleware in self.router.response_middleware:
+            check(middleware, ("response",), False)
+
+        for component in self.resolver.components:
+            check(component.get)
+
+        if unresolved:
+            raise UnresolvedParameters(unresolved)
+
+        self.router.freeze()
+        self._prebuilt_miss(404)
+        # the IPWARE_* settings, parsed once for BoomRequest.remote_addr
+        self.proxy_config = ProxyConfig.from_config(self.config)
+
+        report = {
+            "routes": len(self.router.routes_names),
+            "chains": len(chains),
+            "plans": len(self.resolver._plans),
+            "components": len(self.resolver.components),
+        }
+        logger.info(
+            "sanic-boom finalized: {routes} routes, {chains} route chains, "
+            "{plans} injection plans and {components} "
+            "components".format(**report)
+        )
+        return report
+
+    def preload(self):
+        """Finalizes the application in the current process and moves every
+        object alive to the permanent generation of the garbage collector
+        (Python 3.7+), so it never touches them again. When this runs in the
+        master process, before forking the workers, they inherit the route
+        chains, injection plans and component lookups already built, and
+        copy-on-write keeps sharing those memory pages among them.
+
+        ``run`` calls it if ``preload=True`` (or ``BOOM_PRELOAD`` is set);
+        with Gunicorn, call it at the end of the module that creates the app
+        and use ``--preload``.
+
+        :return: the report of :meth:`finalize`
+        """
+        report = self.finalize()
+        gc.collect()
+        if hasattr(gc, "freeze"):
+            gc.freeze()
+        return report
+
+    def run(self, *args, preload=None, **kwargs):
+        if preload is None:
+            preload = is_set(self.config.get("BOOM_PRELOAD", False))
+        if preload:
+            self.preload()
+        else:
+            # the shared APP cache must exist before the workers are forked
+            self.cache_engine.configure(self.config)
+        return super().run(*args, **kwargs)
+
     def add_component(self, component: Component):
         self.resolver.add_component(component)
 
+    def cache_info(self):
+        """The sizes and hit / miss counters of the lookup caches of this
+        application: route matches (by the router) and component matches
+        (by the resolver)."""
+        return {
+            "router": self.router.cache_info(),
+            "resolver": self.resolver.cache_info(),
+        }
+
+    def clear_caches(self):
+        """Drops every cached route chain, route match, injection plan and
+        component match of this application; they are built again on
+        demand."""
+        self.router.clear_chains()
+        self.resolver.clear()
+
+    def instrument(self, sink=None):
+        """Enables the per stage instrumentation of requests (and of every
+        component evaluated by the cache engine), sending the durations to
+        ``sink`` (a ``MemorySink`` by default). ``instrument(False)``
+        disables it again.
+
+        :return: the sink in use
+        """
+        if sink is None:
+            sink = MemorySink()
+        elif sink is False:
+            sink = None
+        self.instrumentation = sink
+        self.cache_engine.sink = sink
+        return sink
+
+    def add_converter(self, annotation, converter):
+        """Registers the callable converting route parameters annotated with
+        ``annotation``; it should raise ``ValueError`` (or ``TypeError``) for
+        invalid values, answered with a 400 response."""
+        self.resolver.add_converter(annotation, converter)
+
+    async def warm_up(self):
+        """Evaluates every eager component (see ``Component.is_eager``) for
+        each route, middleware and parameter using it, so their caches are
+        already populated when the first request arrives. Since there is no
+        request yet, a bare request to the route URI is provided. Errors are
+        logged and the component is left to be evaluated on demand.
+
+        :return: the number of evaluated components
+        """
+        warmed = 0
+
+        for (route, method), chain in self.router.build_chains().items():
+            request = None
+
+            for func, slot in self._eager_slots(route, chain):
+                if request is None:
+                    request = self.request_class(
+                        url_bytes=route.uri.encode(),
+                        headers={},
+                        version="1.1",
+                        method=method,
+                        transport=None,
+                    )
+                    request.app = self
+                    request.uri_template = route.uri
+
+                try:
+                    await self.cache_engine.get(
+                        slot.component, func, request, slot.param
+                    )
+                    warmed += 1
+                except Exception:
+                    error_logger.exception(
+                        "Exception occurred while warming up the '{}' "
+                        "parameter of {}".format(
+                            slot.name, getattr(func, "__qualname__", func)
+                        )
+                    )
+
+        if warmed:
+            logger.info("sanic-boom warmed up {} components".format(warmed))
+        return warmed
+
+    def _eager_slots(self, route, chain):
+        lazy_lifecycles = (ComponentCache.NO_CACHE, ComponentCache.REQUEST)
+        funcs = (
+            (chain.handler,)
+            + chain.request_middlewares
+            + chain.global_response_middlewares
+            + chain.response_middlewares
+        )
+
+        for func in funcs:
+            for branch in self.resolver.get_plan(func).branches:
+                for slot in branch:
+                    if func is chain.handler and slot.name in route.params:
+                        continue  # the route will provide it
+                    if (
+                        slot.component.is_eager()
+                        and slot.component.get_cache_lifecycle()
+                        not in lazy_lifecycles
+                    ):
+                        yield func, slot
+
     def url_for(
         self,
         view_name: str,
@@ -54,14 +329,30 @@ class SanicBoom(Sanic):
         _method: object = None,
         **kwargs
     ):
-        # ? i think this should be in the Router
-        uri, route = self.router.find_route_by_view_name(view_name)
+        _scheme, _server = self._url_location(_external, _scheme, _server)
+        return self._build_url(view_name, kwargs, _scheme, _server, _anchor)
 
-        if not (uri and route):
-            raise URLBuildError(
-                "Endpoint with name `{}` was not found".format(view_name)
-            )
+    def url_for_many(
+        self,
+        links,
+        _anchor: str = "",
+        _external: bool = False,
+        _scheme: str = "",
+        _server: str = None,
+    ):
+        """Builds several URLs at once, as :meth:`url_for` would do for each
+        one of them, but working out the scheme and server only once.
+
+        :param links: an iterable of ``(view_name, kwargs)`` pairs
+        :return: a list with the URLs, in the same order of ``links``
+        """
+        _scheme, _server = self._url_location(_external, _scheme, _server)
+        return [
+            self._build_url(view_name, dict(kwargs), _scheme, _server, _anchor)
+            for view_name, kwargs in links
+        ]
 
+    def _url_location(self, _external, _scheme, _server):
         if _scheme and not _external:
             raise ValueError("When specifying _scheme, _external must be True")
 
@@ -78,34 +369,40 @@ class SanicBoom(Sanic):
             if "://" in _server[:8]:
                 _server = _server.split("://", 1)[-1]
 
-        orig_uri = uri
-        replaced_vars = []
+        return _scheme, _server
 
-        for k in kwargs:
-            if re.search(r"([:|\*])", str(kwargs[k])):
-                raise URLBuildError(
-                    "The parameter '{}' passed for URL `{}` with the value of "
-                    "'{}' may contain invalid characters that can break the "
-                    "URL".format(k, orig_uri, kwargs[k])
-                )
+    def _build_url(self, view_name, kwargs, _scheme, _server, _anchor):
+        uri, route = self.router.find_route_by_view_name(view_name)
 
-            m = re.search(r"([:|\*]{})".format(k), uri)
-            if m:
-                replaced_vars.append(k)
-                uri = uri.replace(m.group(0), str(kwargs[k]))
-            # else log ?
+        if not (uri and route):
+            raise URLBuildError(
+                "Endpoint with name `{}` was not found".format(view_name)
+            )
 
-        for k in replaced_vars:
-            del kwargs[k]
+        template = route.template
 
-        if uri.find(":") > -1 or uri.find("*") > -1:
+        try:
+            uri = template.expand(kwargs)
+        except KeyError:
             raise URLBuildError(
                 "Required parameters for URL `{}` was not passed to "
-                "url_for".format(orig_uri)
+                "url_for".format(template.uri)
             )
 
+        for k in template.params:
+            value = kwargs.pop(k)
+            if _INVALID_URL_VALUE(str(value)):
+                raise URLBuildError(
+                    "The parameter '{}' passed for URL `{}` with the value of "
+                    "'{}' may contain invalid characters that can break the "
+                    "URL".format(k, template.uri, value)
+                )
+
         # parse the remainder of the keyword arguments into a querystring
         query_string = urlencode(kwargs, doseq=True) if kwargs else ""
+
+        if not (_scheme or _server or _anchor):
+            return uri + "?" + query_string if query_string else uri
         # scheme://netloc/path;parameters?query#fragment
         return urlunparse((_scheme, _server, uri, "", query_string, _anchor))
 
@@ -137,11 +434,11 @@ class SanicBoom(Sanic):
         elif isinstance(methods, (frozenset, set)):
             methods = list(methods)
 
-        if stream:  # noqa | do I really need to bother with this? For now?
+        if stream:
             self.is_request_stream = True
 
         def response(handler):
-            if stream:  # noqa I have no idea how to handle this right now
+            if stream:
                 handler.is_stream = stream
             self.router.add(uri, methods, handler, version=version, name=name)
             return handler
@@ -165,10 +462,13 @@ class SanicBoom(Sanic):
 
     def register_middleware(self, middleware, attach_to="request", **kwargs):
         if "uri" not in kwargs and "methods" not in kwargs:
+            if self.router.frozen:
+                raise RouterFrozen()
             if attach_to == "request":
                 self.request_middleware.append(middleware)
             if attach_to == "response":
                 self.response_middleware.appendleft(middleware)
+            self._sync_global_middlewares()
             return middleware
 
         uri = kwargs.pop("uri", "/")
@@ -195,45 +495,73 @@ class SanicBoom(Sanic):
         # allocation before assignment below.
         response = None
         cancelled = False
-        middlewares = []
+        chain = None
+        # whether the layered middlewares of the route were reached, only
+        # then its layered response middlewares run
+        layered = False
+        timer = None
+        if self.instrumentation is not None:
+            timer = StageTimer(self.instrumentation)
         try:
-            # --------------------------------------------------------------- #
-            # request "global" middlewares
-            # --------------------------------------------------------------- #
             request.app = self
-            if self.request_middleware:
-                response = await self._run_request_middleware(
-                    request, self.request_middleware
-                )
-            # No middleware result
-            if not response:
-                # Fetch handler from router
-                handler, middlewares, kwargs, uri = self.router.get(request)
-                request.uri_template = uri
-                # handler = self.request.route_handlers.endpoint
-                # middlewares = self.request.route_handlers.middlewares
-                # kwargs = self.request.route_params
-
-                # run layered request middlewares
-                request_middleware = [
-                    m.handler
-                    for m in middlewares
-                    if m.attach_to == MiddlewareType.REQUEST
-                ]
-
-                if request_middleware:
+            # Fetch the precomputed route chain from router
+            match = self.router.match(request)
+            if timer is not None:
+                timer.mark("router")
+
+            if match.__class__ is RouteMiss:
+                # ----------------------------------------------------------- #
+                # request "global" middlewares still run for requests that
+                # could not be routed, they may very well have a response
+                # ----------------------------------------------------------- #
+                if self.router.request_middleware:
+                    response = await self._run_request_middleware(
+                        request, self.router.request_middleware
+                    )
+                    if timer is not None:
+                        timer.mark("global_request_middleware")
+                if not response:
+                    if not self._prebuilt_miss(match.status):
+                        raise match.exception()
+                    # no handler of our own for them, so the default error
+                    # handler (and its traceback logging) can be skipped
+                    response = match.response()
+            else:
+                chain, kwargs = match
+                request.uri_template = chain.uri
+
+                # run request middlewares, "global" (that always come first
+                # in the chains) and then layered ones
+                middlewares = chain.request_middlewares
+                split = len(self.router.request_middleware)
+                if split:
                     response = await self._run_request_middleware(
-                        request, request_middleware
+                        request, middlewares, 0, split
                     )
+                    if timer is not None:
+                        timer.mark("global_request_middleware")
+                if not response:
+                    layered = True
+                    if len(middlewares) > split:
+                        response = await self._run_request_middleware(
+                            request, middlewares, split
+                        )
+                        if timer is not None:
+                            timer.mark("layered_request_middleware")
 
                 if not response:
                     # run response handler
+                    handler = chain.handler
                     ret = await self.resolver.resolve(
                         request=request, func=handler, prefetched=kwargs
                     )
+                    if timer is not None:
+                        timer.mark("resolve")
                     response = handler(**ret)
                     if isawaitable(response):
                         response = await response
+                    if timer is not None:
+                        timer.mark("handler")
         except CancelledError:
             # If response handler times out, the server handles the error
             # and cancels the handle_request job.
@@ -266,6 +594,8 @@ class SanicBoom(Sanic):
                     response = HTTPResponse(
                         "An error occurred while handling an error", status=500
                     )
+            if timer is not None:
+                timer.mark("error_handler")
         finally:
             # --------------------------------------------------------------- #
             # Response Middleware
@@ -273,21 +603,29 @@ class SanicBoom(Sanic):
             # Don't run response middleware if response is None
             if response is not None:
                 try:
-                    if self.response_middleware:
+                    # "global" and then layered response middlewares, a
+                    # response returned by the former doesn't skip the latter
+                    if chain is not None:
+                        global_middleware = chain.global_response_middlewares
+                    else:
+                        global_middleware = self.router.response_middleware
+                    if layered:
+                        layered_middleware = chain.response_middlewares
+                    else:
+                        layered_middleware = ()
+
+                    if global_middleware:
                         response = await self._run_response_middleware(
-                            request, response, self.response_middleware
+                            request, response, global_middleware
                         )
-                    # run layered response middlewares
-                    response_middleware = [
-                        m.handler
-                        for m in middlewares
-                        if m.attach_to == MiddlewareType.RESPONSE
-                    ]
-
-                    if response_middleware:
+                    if layered_middleware:
                         response = await self._run_response_middleware(
-                            request, response, response_middleware
+                            request, response, layered_middleware
                         )
+                    if timer is not None and (
+                        global_middleware or layered_middleware
+                    ):
+                        timer.mark("response_middleware")
 
                 except CancelledError:
                     # Response middleware can timeout too, as above.
@@ -298,6 +636,8 @@ class SanicBoom(Sanic):
                         "Exception occurred in one of response "
                         "middleware handlers"
                     )
+            if timer is not None:
+                timer.finish()
             if cancelled:
                 raise CancelledError()
 
@@ -306,9 +646,18 @@ class SanicBoom(Sanic):
             await stream_callback(response)
         else:
             write_callback(response)
+        # the REQUEST cached values (a database session, for instance) are
+        # not kept alive by the request anymore
+        if isinstance(request, BoomRequest):
+            request.component_values = None
 
-    async def _run_request_middleware(self, request, middlewares):
-        for middleware in middlewares:
+    async def _run_request_middleware(
+        self, request, middlewares, start=0, stop=None
+    ):
+        if stop is None:
+            stop = len(middlewares)
+        for index in range(start, stop):
+            middleware = middlewares[index]
             ret = await self.resolver.resolve(request=request, func=middleware)
             response = middleware(**ret)
             if isawaitable(response):
@@ -1,23 +1,121 @@
+import asyncio
 import inspect
 import typing as t
-import warnings
 from threading import local as t_local
+from time import perf_counter
 
 from sanic.request import Request
 
 from sanic_boom.component import Component, ComponentCache
-from sanic_boom.references import DOC_LINKS as dl
-from sanic_boom.request import BoomRequest
-from sanic_boom.utils import REQUEST_CACHE_KEY
+from sanic_boom.request import BoomRequest, ComponentValues
+from sanic_boom.shared_store import SharedMemoryStore
+from sanic_boom.store import MISSING, MemoryStore, deep_sizeof
+from sanic_boom.utils import COMPONENT_TRACE_KEY, REQUEST_CACHE_KEY, is_set
 
+try:
+    _current_task = asyncio.current_task
+except AttributeError:  # Python < 3.7
+    _current_task = asyncio.Task.current_task
 
-class CacheEngine:
 
-    _thread_local = t_local()
+class InFlight:
+    """Placeholder kept in a cache while its value is still being computed,
+    so concurrent lookups can await it instead of computing it again."""
+
+    __slots__ = ("future",)
+
+    def __init__(self):
+        self.future = asyncio.get_event_loop().create_future()
+
+    def __repr__(self):
+        return "<InFlight: {!r}>".format(self.future)
+
+
+class TraceEntry:
+    """How a component was resolved for a parameter: whether it was cached,
+    how long it took (in seconds) and if it failed."""
+
+    __slots__ = (
+        "component",
+        "param",
+        "lifecycle",
+        "cached",
+        "duration",
+        "error",
+    )
+
+    def __init__(
+        self,
+        component: Component,
+        param: inspect.Parameter,
+        lifecycle: ComponentCache,
+    ):
+        self.component = component
+        self.param = param
+        self.lifecycle = lifecycle
+        self.cached = True
+        self.duration = 0.0
+        self.error = False
+
+    def __repr__(self):
+        return (
+            "<TraceEntry component: {}, param: {}, lifecycle: {}, "
+            "cached: {}>".format(
+                self.component.__class__.__name__,
+                self.param.name,
+                self.lifecycle.name,
+                self.cached,
+            )
+        )
+
+
+class ComponentStats:
+    __slots__ = ("name", "lifecycle", "hits", "misses", "errors", "time")
+
+    def __init__(self, name: str, lifecycle: ComponentCache):
+        self.name = name
+        self.lifecycle = lifecycle
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        # spent evaluating the component, so only on misses
+        self.time = 0.0
+
+    def as_dict(self) -> t.Dict[str, t.Any]:
+        return {
+            "lifecycle": self.lifecycle.name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "time": self.time,
+        }
+
+    def __repr__(self):
+        return "<ComponentStats {}: {}>".format(self.name, self.as_dict())
+
 
+class CacheEngine:
     def __init__(self, app):
         self.app = app
-        self._endpoints = {}
+        # an instrumentation.Sink, see SanicBoom.instrument
+        self.sink = None
+        # counts hits, misses, errors and evaluation time per component, and
+        # keeps the trace of every request (see BoomRequest.component_trace)
+        self.tracing = False
+        self.component_stats = {}
+        self._traced_calls = {}
+        self._thread_local = t_local()
+        # REQUEST cached values live in BoomRequest.component_values, indexed
+        # by the ids given to their parameters (see request_index)
+        self.request_params = []
+        self._request_indexes = {}
+        # there is only one event loop per worker process
+        self.worker_cache = {}
+        self.worker_loop = None
+        # sized by the BOOM_ENDPOINT_CACHE_* and BOOM_APP_CACHE_* settings,
+        # see configure
+        self.endpoint_cache = MemoryStore(max_entries=4096, sizeof=deep_sizeof)
+        self.app_cache = MemoryStore(max_entries=1024, sizeof=deep_sizeof)
 
     # ----------------------------------------------------------------------- #
     # "public" methods
@@ -28,26 +126,253 @@ class CacheEngine:
         endpoint: t.Callable,
         request: t.Union[Request, BoomRequest],
         param: inspect.Parameter,
+        index: t.Optional[int] = None,
+    ):
+        if self.tracing or self.sink is not None:
+            return await self._traced_get(
+                component, endpoint, request, param, index
+            )
+        return await self._get(component, endpoint, request, param, index)
+
+    def request_index(self, param: inspect.Parameter) -> int:
+        """The index of the ``REQUEST`` cached values of ``param`` in
+        ``BoomRequest.component_values``, given by the resolver when it
+        compiles an injection plan (or else on the first lookup)."""
+        index = self._request_indexes.get(param)
+        if index is None:
+            index = self._request_indexes[param] = len(self.request_params)
+            self.request_params.append(param)
+        return index
+
+    def stats(self) -> t.Dict[str, t.Dict[str, t.Any]]:
+        """The hit, miss, error and evaluation time counters of every traced
+        component (see ``tracing``), by component class name."""
+        return {
+            stats.name: stats.as_dict()
+            for stats in self.component_stats.values()
+        }
+
+    def invalidate(
+        self,
+        component: t.Optional[t.Union[Component, t.Type[Component]]] = None,
+        param: t.Optional[inspect.Parameter] = None,
+    ) -> int:
+        """Removes values from the ``APP`` cache, by component (instance or
+        class), by parameter or both. Without arguments, the whole cache is
+        cleared.
+
+        :return: the number of values removed
+        """
+
+        def matches(key):
+            cached_component, cached_param = key
+            if component is not None:
+                if isinstance(component, Component):
+                    if cached_component is not component:
+                        return False
+                elif not isinstance(cached_component, component):
+                    return False
+            return param is None or cached_param == param
+
+        return self.app_cache.invalidate(matches)
+
+    def share_app_cache(
+        self, size: int = 16 * 1024 * 1024, path: t.Optional[str] = None
+    ) -> SharedMemoryStore:
+        """Moves the ``APP`` cache to a :class:`SharedMemoryStore` of ``size``
+        bytes, so its values are computed once and held once for every worker
+        forked afterwards (or every process mapping the same ``path``). Values
+        that can't be pickled stay in each worker."""
+        self.app_cache = SharedMemoryStore(
+            size=size,
+            slots=getattr(self.app_cache, "max_entries", None) or 1024,
+            ttl=self.app_cache.ttl,
+            path=path,
+            key_func=_app_cache_key,
+        )
+        return self.app_cache
+
+    def configure(self, config: t.Mapping[str, t.Any]):
+        """Applies the cache settings of ``config`` (see
+        :meth:`SanicBoom.finalize`), so they may be changed on
+        ``app.config`` until the server starts. It's safe to call it more
+        than once.
+
+        ``BOOM_APP_CACHE_SHARED`` must be applied before the workers are
+        forked to be of any use, which :meth:`SanicBoom.run` (and
+        :meth:`SanicBoom.preload`) take care of."""
+        self.endpoint_cache.ttl = config.get("BOOM_ENDPOINT_CACHE_TTL", None)
+        self.endpoint_cache.max_bytes = config.get(
+            "BOOM_ENDPOINT_CACHE_MAX_BYTES", None
+        )
+        self.endpoint_cache.resize(
+            config.get("BOOM_ENDPOINT_CACHE_MAX_ENTRIES", 4096)
+        )
+        if isinstance(self.app_cache, MemoryStore):
+            self.app_cache.ttl = config.get("BOOM_APP_CACHE_TTL", None)
+            self.app_cache.max_bytes = config.get(
+                "BOOM_APP_CACHE_MAX_BYTES", None
+            )
+            self.app_cache.resize(
+                config.get("BOOM_APP_CACHE_MAX_ENTRIES", 1024)
+            )
+            if is_set(config.get("BOOM_APP_CACHE_SHARED", False)):
+                self.share_app_cache(
+                    size=config.get(
+                        "BOOM_APP_CACHE_SHARED_SIZE", 16 * 1024 * 1024
+                    ),
+                    path=config.get("BOOM_APP_CACHE_SHARED_PATH", None),
+                )
+
+    def start_worker(self, loop: asyncio.AbstractEventLoop):
+        """Starts a fresh ``WORKER`` scope, bound to the given event loop.
+        Called right before the server starts, in every worker."""
+        self.worker_cache = {}
+        self.worker_loop = loop
+
+    def stop_worker(self):
+        """Tears down the ``WORKER`` (and the ``CURRENT_THREAD``) scope.
+        Called right after the server stops, in every worker."""
+        self.worker_cache = {}
+        self.worker_loop = None
+        self._thread_local.sanic_boom_cache = {}
+
+    def flush_endpoint(self, endpoint: t.Callable) -> int:
+        """Removes every ``ENDPOINT`` cached value of the given endpoint (a
+        handler, a middleware or a ``Component.get``).
+
+        :return: the number of values removed
+        """
+        return self.endpoint_cache.invalidate(lambda key: key[0] == endpoint)
+
+    # ----------------------------------------------------------------------- #
+    # "internal" methods
+
+    async def _get(
+        self,
+        component: Component,
+        endpoint: t.Callable,
+        request: t.Union[Request, BoomRequest],
+        param: inspect.Parameter,
+        index: t.Optional[int] = None,
     ):
         lifecycle = component.get_cache_lifecycle()
-        value = None
+        value = MISSING
 
         if lifecycle == ComponentCache.REQUEST:
-            value = await self._resolve_request(component, request, param)
+            value = await self._resolve_request(
+                component, request, param, index
+            )
         elif lifecycle == ComponentCache.ENDPOINT:
             value = await self._resolve_endpoint(
                 component, endpoint, request, param
             )
+        elif lifecycle == ComponentCache.WORKER:
+            value = await self._resolve_worker(component, request, param)
         elif lifecycle == ComponentCache.CURRENT_THREAD:
             value = await self._resolve_thread(component, request, param)
         elif lifecycle == ComponentCache.APP:
             value = await self._resolve_app(component, request, param)
-        if value is not None:
+        if value is not MISSING:  # None is a value like any other
             return value
         return await self._resolve_param(component, request, param)
 
-    # ----------------------------------------------------------------------- #
-    # "internal" methods
+    async def _traced_get(
+        self,
+        component: Component,
+        endpoint: t.Callable,
+        request: t.Union[Request, BoomRequest],
+        param: inspect.Parameter,
+        index: t.Optional[int] = None,
+    ):
+        lifecycle = component.get_cache_lifecycle()
+        entry = TraceEntry(component, param, lifecycle)
+        # _resolve_param runs in the same task as this call, that's how it
+        # tells the lookup was a miss
+        task = _current_task()
+        outer = self._traced_calls.get(task)
+        self._traced_calls[task] = entry
+        started = perf_counter()
+
+        try:
+            return await self._get(component, endpoint, request, param, index)
+        except BaseException:
+            entry.error = True
+            raise
+        finally:
+            entry.duration = perf_counter() - started
+            if outer is None:
+                del self._traced_calls[task]
+            else:
+                self._traced_calls[task] = outer
+
+            if self.sink is not None:
+                self.sink.record(
+                    "component", entry.duration, component.__class__.__name__
+                )
+            if self.tracing:
+                self._account(entry, request)
+
+    def _account(
+        self, entry: TraceEntry, request: t.Union[Request, BoomRequest]
+    ):
+        stats = self.component_stats.get(entry.component)
+        if stats is None:
+            stats = self.component_stats[entry.component] = ComponentStats(
+                entry.component.__class__.__name__, entry.lifecycle
+            )
+        if entry.cached:
+            stats.hits += 1
+        else:
+            stats.misses += 1
+            stats.time += entry.duration
+        if entry.error:
+            stats.errors += 1
+
+        if COMPONENT_TRACE_KEY not in request:
+            request[COMPONENT_TRACE_KEY] = []
+        request[COMPONENT_TRACE_KEY].append(entry)
+
+    async def _single_flight(
+        self,
+        store: t.Dict[t.Any, t.Any],
+        key: t.Any,
+        component: Component,
+        request: t.Union[Request, BoomRequest],
+        param: inspect.Parameter,
+        ttl: t.Optional[float] = None,
+    ) -> t.Any:
+        in_flight = InFlight()
+        store[key] = in_flight
+
+        try:
+            value = await self._resolve_param(component, request, param)
+        except BaseException as e:
+            if store.get(key) is in_flight:
+                del store[key]
+            if isinstance(e, asyncio.CancelledError):
+                # the waiters were not cancelled, they try again instead
+                in_flight.future.set_result(MISSING)
+            else:
+                in_flight.future.set_exception(e)
+                # whoever was waiting gets it, nobody waiting is fine as well
+                in_flight.future.exception()
+            raise
+
+        if store.get(key) is in_flight:
+            if ttl is None:
+                store[key] = value
+            else:
+                store.set(key, value, ttl=ttl)
+        in_flight.future.set_result(value)
+        return value
+
+    async def _wait_in_flight(self, in_flight: InFlight) -> t.Any:
+        """The value being computed, or ``MISSING`` if its computation got
+        cancelled (and the placeholder dropped), so it must be looked up
+        again."""
+        # shielded, so a cancelled waiter won't cancel the computation itself
+        return await asyncio.shield(in_flight.future)
 
     async def _resolve_param(
         self,
@@ -55,6 +380,10 @@ class CacheEngine:
         request: t.Union[Request, BoomRequest],
         param: inspect.Parameter,
     ) -> t.Dict[str, t.Any]:
+        if self._traced_calls:
+            entry = self._traced_calls.get(_current_task())
+            if entry is not None and entry.component is component:
+                entry.cached = False
         kw = await self.app.resolver.resolve(
             request=request, func=component.get, source_param=param
         )
@@ -65,25 +394,49 @@ class CacheEngine:
         component: Component,
         request: t.Union[Request, BoomRequest],
         param: inspect.Parameter,
+        index: t.Optional[int] = None,
     ) -> t.Dict[str, t.Any]:
-        if (
-            REQUEST_CACHE_KEY in request
-            and param in request[REQUEST_CACHE_KEY]
-        ):
-            return request[REQUEST_CACHE_KEY][param]
-        return await self._evaluate_request(component, request, param)
+        if not isinstance(request, BoomRequest):
+            # plain Sanic requests keep them in a dict, under a private key
+            values = request.get(REQUEST_CACHE_KEY)
+            key = param
+        else:
+            values = request.component_values
+            key = index if index is not None else self.request_index(param)
+
+        if values is not None:
+            try:
+                value = values[key]
+            except (IndexError, KeyError):
+                value = MISSING
+            if type(value) is InFlight:
+                value = await self._wait_in_flight(value)
+                if value is MISSING:
+                    return await self._resolve_request(
+                        component, request, param, index
+                    )
+            if value is not MISSING:
+                return value
+        return await self._evaluate_request(component, request, param, key)
 
     async def _evaluate_request(
         self,
         component: Component,
         request: t.Union[Request, BoomRequest],
         param: inspect.Parameter,
+        key: t.Any,
     ) -> t.Dict[str, t.Any]:
-        value = await self._resolve_param(component, request, param)
-        if REQUEST_CACHE_KEY not in request:
-            request[REQUEST_CACHE_KEY] = {}
-        request[REQUEST_CACHE_KEY][param] = value
-        return value
+        if not isinstance(request, BoomRequest):
+            values = request.setdefault(REQUEST_CACHE_KEY, {})
+        else:
+            values = request.component_values
+            if values is None:
+                values = request.component_values = ComponentValues(
+                    self.request_params
+                )
+        return await self._single_flight(
+            values, key, component, request, param
+        )
 
     async def _resolve_endpoint(
         self,
@@ -92,11 +445,18 @@ class CacheEngine:
         request: t.Union[Request, BoomRequest],
         param: inspect.Parameter,
     ) -> t.Dict[str, t.Any]:
-        if endpoint in self._endpoints and param in self._endpoints[endpoint]:
-            return self._endpoints[endpoint][param]
-        return await self._evaluate_endpoint(
-            component, endpoint, request, param
-        )
+        value = self.endpoint_cache.lookup((endpoint, param))
+        if value is MISSING:
+            return await self._evaluate_endpoint(
+                component, endpoint, request, param
+            )
+        if type(value) is InFlight:
+            value = await self._wait_in_flight(value)
+            if value is MISSING:
+                return await self._resolve_endpoint(
+                    component, endpoint, request, param
+                )
+        return value
 
     async def _evaluate_endpoint(
         self,
@@ -105,23 +465,49 @@ class CacheEngine:
         request: t.Union[Request, BoomRequest],
         param: inspect.Parameter,
     ) -> t.Dict[str, t.Any]:
-        value = await self._resolve_param(component, request, param)
-        if endpoint not in self._endpoints:
-            self._endpoints[endpoint] = {}
-        self._endpoints[endpoint][param] = value
+        return await self._single_flight(
+            self.endpoint_cache,
+            (endpoint, param),
+            component,
+            request,
+            param,
+            ttl=component.get_cache_ttl(),
+        )
+
+    async def _resolve_worker(
+        self,
+        component: Component,
+        request: t.Union[Request, BoomRequest],
+        param: inspect.Parameter,
+    ) -> t.Dict[str, t.Any]:
+        value = self.worker_cache.get(param, MISSING)
+        if value is MISSING:
+            return await self._evaluate_worker(component, request, param)
+        if type(value) is InFlight:
+            value = await self._wait_in_flight(value)
+            if value is MISSING:
+                return await self._resolve_worker(component, request, param)
         return value
 
+    async def _evaluate_worker(
+        self,
+        component: Component,
+        request: t.Union[Request, BoomRequest],
+        param: inspect.Parameter,
+    ) -> t.Dict[str, t.Any]:
+        return await self._single_flight(
+            self.worker_cache, param, component, request, param
+        )
+
     async def _resolve_thread(
         self,
         component: Component,
         request: t.Union[Request, BoomRequest],
         param: inspect.Parameter,
     ) -> t.Dict[str, t.Any]:
-        if (
-            hasattr(self._thread_local, "sanic_boom_cache")
-            and param in self._thread_local.sanic_boom_cache
-        ):
-            return self._thread_local.sanic_boom_cache[param]
+        cache = getattr(self._thread_local, "sanic_boom_cache", None)
+        if cache is not None and param in cache:
+            return cache[param]
         return await self._evaluate_thread(component, request, param)
 
     async def _evaluate_thread(
@@ -131,9 +517,10 @@ class CacheEngine:
         param: inspect.Parameter,
     ) -> t.Dict[str, t.Any]:
         value = await self._resolve_param(component, request, param)
-        if not hasattr(self._thread_local, "sanic_boom_cache"):
-            self._thread_local.sanic_boom_cache = {}
-        self._thread_local.sanic_boom_cache[param] = value
+        cache = getattr(self._thread_local, "sanic_boom_cache", None)
+        if cache is None:
+            cache = self._thread_local.sanic_boom_cache = {}
+        cache[param] = value
         return value
 
     async def _resolve_app(
@@ -142,13 +529,40 @@ class CacheEngine:
         request: t.Union[Request, BoomRequest],
         param: inspect.Parameter,
     ) -> t.Dict[str, t.Any]:
-        warnings.warn(
-            "This method relies on a custom implementation by the user. More "
-            "information about how to implement, why and examples on "
-            "{}".format(dl.get("CacheEngine._resolve_app")),
-            RuntimeWarning,
+        value = self.app_cache.lookup((component, param))
+        if value is MISSING:
+            return await self._evaluate_app(component, request, param)
+        if type(value) is InFlight:
+            value = await self._wait_in_flight(value)
+            if value is MISSING:
+                return await self._resolve_app(component, request, param)
+        return value
+
+    async def _evaluate_app(
+        self,
+        component: Component,
+        request: t.Union[Request, BoomRequest],
+        param: inspect.Parameter,
+    ) -> t.Dict[str, t.Any]:
+        return await self._single_flight(
+            self.app_cache,
+            (component, param),
+            component,
+            request,
+            param,
+            ttl=component.get_cache_ttl(),
         )
-        return None
 
 
-__all__ = ("CacheEngine",)
+def _app_cache_key(key: t.Tuple[Component, inspect.Parameter]) -> str:
+    # the same in every process, unlike the identity of the component
+    component, param = key
+    return "{}.{}:{}:{!r}".format(
+        type(component).__module__,
+        type(component).__qualname__,
+        param.name,
+        param.annotation,
+    )
+
+
+__all__ = ("CacheEngine", "ComponentStats", "InFlight", "TraceEntry")
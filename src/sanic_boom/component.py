@@ -1,4 +1,5 @@
 import inspect
+import typing as t
 from enum import IntEnum
 
 
@@ -8,6 +9,32 @@ class ComponentCache(IntEnum):
     ENDPOINT = 4
     CURRENT_THREAD = 8
     APP = 16
+    WORKER = 32
+
+
+class MatchKeys:
+    """What a component resolves, declared ahead of time: any parameter with
+    one of the ``names``, annotated with one of the ``annotations`` or with a
+    generic type whose origin (``typing.List[int]`` -> ``list``) is one of the
+    ``origins``. The resolver indexes them, so ``Component.resolve`` is never
+    called for components declaring their keys."""
+
+    __slots__ = ("names", "annotations", "origins")
+
+    def __init__(
+        self,
+        names: t.Iterable[str] = (),
+        annotations: t.Iterable[t.Any] = (),
+        origins: t.Iterable[t.Any] = (),
+    ):
+        self.names = tuple(names)
+        self.annotations = tuple(annotations)
+        self.origins = tuple(origins)
+
+    def __repr__(self):
+        return "<MatchKeys names: {}, annotations: {}, origins: {}>".format(
+            self.names, self.annotations, self.origins
+        )
 
 
 class Component:
@@ -17,6 +44,19 @@ class Component:
     def get_cache_lifecycle(self) -> ComponentCache:
         return ComponentCache.NO_CACHE
 
+    def get_cache_ttl(self) -> t.Optional[float]:
+        # only honored by the ENDPOINT and APP cache lifecycles
+        return None
+
+    def is_eager(self) -> bool:
+        # eager components are evaluated for every route that uses them right
+        # before the server starts (does nothing for REQUEST and NO_CACHE)
+        return False
+
+    def get_match_keys(self) -> t.Optional[MatchKeys]:
+        # without match keys, resolve is called for every new parameter
+        return None
+
     def resolve(self, param: inspect.Parameter) -> bool:
         raise NotImplementedError  # noqa
 
@@ -24,4 +64,4 @@ class Component:
         raise NotImplementedError  # noqa
 
 
-__all__ = ("Component", "ComponentCache")
+__all__ = ("Component", "ComponentCache", "MatchKeys")
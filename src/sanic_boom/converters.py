@@ -0,0 +1,70 @@
+import inspect
+import typing as t
+import uuid
+from datetime import date, datetime
+from enum import Enum
+
+
+def to_bool(value: str) -> bool:
+    return value.lower() in ("true", "yes", "ok")
+
+
+def enum_converter(enum: t.Type[Enum]) -> t.Callable[[str], Enum]:
+    # values are tried first (converted to the mixed in type, if any, like
+    # int for IntEnum), then names
+    member_type = getattr(enum, "_member_type_", object)
+
+    def convert(value: str) -> Enum:
+        try:
+            if member_type is object:
+                return enum(value)
+            return enum(member_type(value))
+        except (ValueError, TypeError):
+            pass
+        try:
+            return enum[value]
+        except KeyError:
+            raise ValueError(
+                "{!r} is not a valid {}".format(value, enum.__name__)
+            )
+
+    return convert
+
+
+class ConverterRegistry:
+    """Maps annotations to the callables converting the (``str``) values of
+    route parameters to them. Annotations without a converter (``str``
+    included) are left as they are. Besides the registered annotations, any
+    ``Enum`` subclass is converted by value or by name.
+    """
+
+    def __init__(self):
+        self._converters = {
+            int: int,
+            float: float,
+            bool: to_bool,
+            uuid.UUID: uuid.UUID,
+        }
+        # not available in Python < 3.7
+        if hasattr(datetime, "fromisoformat"):
+            self._converters[datetime] = datetime.fromisoformat
+            self._converters[date] = date.fromisoformat
+
+    def register(self, annotation: t.Any, converter: t.Callable[[str], t.Any]):
+        self._converters[annotation] = converter
+
+    def find(self, annotation: t.Any) -> t.Optional[t.Callable[[str], t.Any]]:
+        if annotation is inspect.Parameter.empty:
+            return None
+        try:
+            return self._converters[annotation]
+        except (KeyError, TypeError):  # not registered or not hashable
+            pass
+        if inspect.isclass(annotation) and issubclass(annotation, Enum):
+            converter = enum_converter(annotation)
+            self._converters[annotation] = converter
+            return converter
+        return None
+
+
+__all__ = ("ConverterRegistry",)
@@ -24,3 +24,51 @@ class InvalidComponent(SanicBoomException):
         **kwargs
     ):
         super().__init__(message, **kwargs)
+
+
+class RouterFrozen(SanicBoomException):
+    def __init__(
+        self,
+        message="The router was already finalized and can not receive new "
+        "routes or middlewares",
+        **kwargs
+    ):
+        super().__init__(message, **kwargs)
+
+
+class UnresolvedParameters(SanicBoomException):
+    def __init__(self, unresolved, **kwargs):
+        self.unresolved = unresolved
+        super().__init__(
+            "The following parameters could not be resolved to a component: "
+            "{}".format(
+                ", ".join(
+                    '"{}" of {}'.format(name, where)
+                    for where, name in unresolved
+                )
+            ),
+            **kwargs
+        )
+
+
+class CircularDependency(UnresolvedParameters):
+    def __init__(self, where, name, **kwargs):
+        self.unresolved = [(where, name)]
+        SanicBoomException.__init__(
+            self,
+            'The parameter "{}" of {} depends on the component itself, '
+            "directly or through other components".format(name, where),
+            **kwargs
+        )
+
+
+class InvalidParameter(SanicBoomException):
+    status_code = 400
+
+    def __init__(self, name, value, **kwargs):
+        self.name = name
+        self.value = value
+        super().__init__(
+            'Invalid value for the parameter "{}": {!r}'.format(name, value),
+            **kwargs
+        )
@@ -0,0 +1,180 @@
+import hashlib
+import typing as t
+import uuid
+from collections import namedtuple
+
+from sanic.response import HTTPResponse
+
+from sanic_boom.request import BoomRequest
+from sanic_boom.store import MISSING, MemoryStore
+
+CachedResponse = namedtuple(
+    "CachedResponse", ("status", "body", "content_type", "headers", "etag")
+)
+
+
+class ResponseCache:
+    """Caches the responses of every route under ``uri`` (a prefix, as with
+    layered middlewares) in a bounded :class:`MemoryStore`. It's made of a
+    pair of layered middlewares: the request one answers from the cache, so
+    neither the handler nor its components (nor any deeper layered
+    middleware) are invoked, and the response one stores what the handler
+    returned.
+
+    Responses are keyed by method, path, the ``query_params`` given (the
+    whole query string if ``None``) and the values of the ``vary`` request
+    headers. Each one gets an ``ETag``, and requests with a matching
+    ``If-None-Match`` are answered with a ``304``.
+
+    Only complete (not streamed) responses with one of the given
+    ``statuses`` are stored, and never if they set cookies or have a
+    ``Cache-Control`` of ``no-store`` or ``private``. Requests with an
+    ``Authorization`` header skip the cache (RFC 7234, section 3.2), unless
+    ``allow_authorized`` is set.
+    """
+
+    def __init__(
+        self,
+        app,
+        uri: str = "/",
+        ttl: t.Optional[float] = None,
+        max_entries: t.Optional[int] = 1024,
+        max_bytes: t.Optional[int] = None,
+        query_params: t.Optional[t.Iterable[str]] = None,
+        vary: t.Iterable[str] = (),
+        methods: t.Iterable[str] = ("GET",),
+        statuses: t.Iterable[int] = (200,),
+        allow_authorized: bool = False,
+    ):
+        self.uri = uri
+        self.query_params = (
+            tuple(query_params) if query_params is not None else None
+        )
+        self.vary = tuple(vary)
+        self.statuses = frozenset(statuses)
+        self.allow_authorized = allow_authorized
+        # where the request middleware leaves the key for the response one,
+        # one per instance since caches may be layered
+        self.request_key = "_sanic_boom_response_cache_{!s}".format(
+            uuid.uuid4()
+        )
+        self.store = MemoryStore(
+            max_entries=max_entries,
+            ttl=ttl,
+            max_bytes=max_bytes,
+            sizeof=lambda entry: len(entry.body),
+        )
+        app.register_middleware(
+            self.request_middleware, "request", uri=uri, methods=methods
+        )
+        app.register_middleware(
+            self.response_middleware, "response", uri=uri, methods=methods
+        )
+
+    def invalidate(self, path: t.Optional[str] = None) -> int:
+        """Drops every cached response, or only the ones for paths starting
+        with ``path``.
+
+        :return: the number of dropped responses
+        """
+        if path is None:
+            return self.store.invalidate()
+        return self.store.invalidate(lambda key: key[1].startswith(path))
+
+    def stats(self) -> t.Dict[str, int]:
+        return self.store.stats()
+
+    def get_key(self, request: BoomRequest) -> tuple:
+        if self.query_params is None:
+            query = request.query_string
+        else:
+            args = request.args
+            query = tuple(
+                (name, tuple(args.getlist(name)))
+                for name in self.query_params
+                if name in args
+            )
+        headers = request.headers
+        return (
+            request.method,
+            request.path,
+            query,
+            tuple(headers.get(name) for name in self.vary),
+        )
+
+    async def request_middleware(self, request):
+        if not self.allow_authorized and "Authorization" in request.headers:
+            return None
+
+        key = self.get_key(request)
+        entry = self.store.lookup(key)
+
+        if entry is MISSING:
+            # the response middleware stores what the handler returns
+            request[self.request_key] = key
+            return None
+
+        if _etag_matches(request, entry.etag):
+            return HTTPResponse(status=304, headers={"ETag": entry.etag})
+
+        return HTTPResponse(
+            status=entry.status,
+            headers=entry.headers,
+            content_type=entry.content_type,
+            body_bytes=entry.body,
+        )
+
+    async def response_middleware(self, request, response):
+        key = request.get(self.request_key)
+
+        if key is None or not self._is_cacheable(response):
+            return None
+
+        etag = '"{}"'.format(hashlib.sha1(response.body).hexdigest())
+        response.headers["ETag"] = etag
+        if self.vary:
+            response.headers["Vary"] = ", ".join(self.vary)
+
+        self.store.set(
+            key,
+            CachedResponse(
+                response.status,
+                response.body,
+                response.content_type,
+                tuple(response.headers.items()),
+                etag,
+            ),
+        )
+
+        if _etag_matches(request, etag):
+            return HTTPResponse(status=304, headers={"ETag": etag})
+        return None
+
+    def _is_cacheable(self, response) -> bool:
+        if not isinstance(response, HTTPResponse):
+            return False  # streaming responses, for instance
+        if response.status not in self.statuses or response._cookies:
+            return False
+        cache_control = response.headers.get("Cache-Control", "").lower()
+        return "no-store" not in cache_control and (
+            "private" not in cache_control
+        )
+
+    def __repr__(self):
+        return "<ResponseCache uri: {}, entries: {}>".format(
+            self.uri, len(self.store)
+        )
+
+
+def _etag_matches(request: BoomRequest, etag: str) -> bool:
+    if_none_match = request.headers.get("If-None-Match")
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in (
+        tag.strip().lstrip("W/") for tag in if_none_match.split(",")
+    )
+
+
+__all__ = ("ResponseCache",)
@@ -0,0 +1,149 @@
+import typing as t
+from bisect import bisect_left
+from time import perf_counter
+
+# in seconds, from 10us (router lookups) up to 10s (slow handlers)
+DEFAULT_BUCKETS = (
+    0.00001,
+    0.000025,
+    0.00005,
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+class Sink:
+    """Receives the duration (in seconds) of every instrumented stage of a
+    request: ``router``, ``global_request_middleware``,
+    ``layered_request_middleware``, ``resolve``, ``handler``,
+    ``error_handler``, ``response_middleware`` and ``total``, as well as of
+    each ``component`` evaluated by the cache engine (then ``name`` is the
+    component class name).
+    """
+
+    def record(
+        self, stage: str, duration: float, name: t.Optional[str] = None
+    ):
+        raise NotImplementedError  # noqa
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "count", "sum")
+
+    def __init__(self, buckets: t.Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        # the last one is the implicit +Inf bucket
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self) -> t.List[t.Tuple[float, int]]:
+        """The ``(upper bound, count)`` pairs, as Prometheus expects them."""
+        pairs = []
+        total = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            pairs.append((bound, total))
+        return pairs
+
+    def __repr__(self):
+        return "<Histogram count: {}, sum: {}>".format(self.count, self.sum)
+
+
+class MemorySink(Sink):
+    """Keeps a :class:`Histogram` per stage (and per component) in memory,
+    which can be exported in the Prometheus text format."""
+
+    def __init__(self, buckets: t.Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.histograms = {}
+
+    def record(
+        self, stage: str, duration: float, name: t.Optional[str] = None
+    ):
+        key = (stage, name)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram(self.buckets)
+        histogram.observe(duration)
+
+    def clear(self):
+        self.histograms.clear()
+
+    def export_prometheus(self, prefix: str = "sanic_boom") -> str:
+        metric = "{}_stage_duration_seconds".format(prefix)
+        lines = [
+            "# HELP {} Time spent in each stage of a request.".format(metric),
+            "# TYPE {} histogram".format(metric),
+        ]
+
+        for (stage, name), histogram in sorted(
+            self.histograms.items(),
+            key=lambda item: (item[0][0], item[0][1] or ""),
+        ):
+            labels = 'stage="{}"'.format(_escape(stage))
+            if name is not None:
+                labels += ',name="{}"'.format(_escape(name))
+
+            for bound, count in histogram.cumulative():
+                lines.append(
+                    '{}_bucket{{{},le="{}"}} {}'.format(
+                        metric, labels, _format_bound(bound), count
+                    )
+                )
+            lines.append(
+                "{}_sum{{{}}} {!r}".format(metric, labels, histogram.sum)
+            )
+            lines.append(
+                "{}_count{{{}}} {}".format(metric, labels, histogram.count)
+            )
+
+        return "\n".join(lines) + "\n"
+
+
+class StageTimer:
+    """Records the time elapsed between consecutive marks of a request."""
+
+    __slots__ = ("sink", "started", "last")
+
+    def __init__(self, sink: Sink):
+        self.sink = sink
+        self.started = self.last = perf_counter()
+
+    def mark(self, stage: str):
+        now = perf_counter()
+        self.sink.record(stage, now - self.last)
+        self.last = now
+
+    def finish(self):
+        self.sink.record("total", perf_counter() - self.started)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_bound(bound: float) -> str:
+    return "+Inf" if bound == float("inf") else repr(bound)
+
+
+__all__ = ("Histogram", "MemorySink", "Sink", "StageTimer")
@@ -0,0 +1,131 @@
+import ipaddress
+import typing as t
+
+from sanic_ipware.defaults import IPWARE_META_PRECEDENCE_ORDER
+
+Address = t.Union[ipaddress.IPv4Address, ipaddress.IPv6Address]
+
+
+def _parse(value: str) -> t.Optional[Address]:
+    try:
+        return ipaddress.ip_address(value)
+    except ValueError:
+        return None
+
+
+def _is_routable(address: Address) -> bool:
+    return address.is_global and not address.is_multicast
+
+
+class ProxyConfig:
+    """The ``IPWARE_PROXY_COUNT``, ``IPWARE_PROXY_TRUSTED_IPS`` and
+    ``IPWARE_REQUEST_HEADER_ORDER`` settings, compiled once per application
+    (by :meth:`SanicBoom.finalize`) so finding the client address of a
+    request only parses the headers, in the given order.
+
+    Trusted proxies are parsed into networks (a single address is a network
+    as well); entries that are neither are matched as prefixes of the
+    proxy address. The address picked follows ``sanic_ipware``: the first
+    routable one found, or else the best (private over loopback) of the
+    left-most ones.
+    """
+
+    __slots__ = (
+        "proxy_count",
+        "trusted_networks",
+        "trusted_prefixes",
+        "headers",
+    )
+
+    def __init__(
+        self,
+        proxy_count: t.Optional[int] = None,
+        trusted_ips: t.Optional[t.Iterable[str]] = None,
+        header_order: t.Optional[t.Iterable[str]] = None,
+    ):
+        self.proxy_count = -1 if proxy_count is None else proxy_count
+        networks = []
+        prefixes = []
+        for entry in trusted_ips or ():
+            try:
+                networks.append(ipaddress.ip_network(entry, strict=False))
+            except ValueError:
+                prefixes.append(entry.strip().lower())
+        self.trusted_networks = tuple(networks)
+        self.trusted_prefixes = tuple(prefixes)
+        self.headers = tuple(
+            header_order
+            if header_order is not None
+            else IPWARE_META_PRECEDENCE_ORDER
+        )
+
+    @classmethod
+    def from_config(cls, config) -> "ProxyConfig":
+        if not config:
+            return cls()
+        return cls(
+            proxy_count=getattr(config, "IPWARE_PROXY_COUNT", None),
+            trusted_ips=getattr(config, "IPWARE_PROXY_TRUSTED_IPS", None),
+            header_order=getattr(config, "IPWARE_REQUEST_HEADER_ORDER", None),
+        )
+
+    @property
+    def trusts_proxies(self) -> bool:
+        return bool(self.trusted_networks or self.trusted_prefixes)
+
+    def is_trusted(self, value: str, address: Address) -> bool:
+        return any(
+            address in network for network in self.trusted_networks
+        ) or (value.startswith(self.trusted_prefixes))
+
+    def get_client_ip(self, headers: t.Mapping[str, str]) -> t.Optional[str]:
+        proxy_count = self.proxy_count
+        trusts_proxies = self.trusts_proxies
+        best = None
+
+        for header in self.headers:
+            value = headers.get(header)
+            if not value:
+                continue
+            ips = [ip.strip().lower() for ip in value.split(",")]
+            ips = [ip for ip in ips if ip]
+            count = len(ips)
+            if count < 1:
+                continue
+            if proxy_count == 0 and count > 1:
+                continue
+            if proxy_count > 0 and proxy_count != count - 1:
+                continue
+            if trusts_proxies and count < 2:
+                continue
+
+            client = _parse(ips[0])
+            proxy = client if count == 1 else _parse(ips[-1])
+            if client is None or proxy is None:
+                continue
+
+            if trusts_proxies:
+                if not self.is_trusted(ips[-1], proxy):
+                    continue
+                best = ips[0]
+                if _is_routable(client):
+                    return best
+            else:
+                # the best so far is not routable (or it would be returned
+                # already), but a private one still beats a loopback one
+                if best is None or not client.is_loopback:
+                    best = ips[0]
+                if _is_routable(client):
+                    return best
+
+        return best
+
+    def __repr__(self):
+        return "<ProxyConfig count: {}, trusted: {}, headers: {}>".format(
+            self.proxy_count,
+            len(self.trusted_networks) + len(self.trusted_prefixes),
+            len(self.headers),
+        )
+
+
+__all__ = ("ProxyConfig",)
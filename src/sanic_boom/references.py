@@ -1,6 +1,4 @@
 DOC_LINKS = {
-    "CacheEngine._resolve_app": "http://CHANGE-HERE.rtfd.io/",
-    "Router.is_stream_handler": "https://github.com/huge-success/sanic/issues/1317",
     "SanicBoom.remove_route": "http://CHANGE-HERE.rtfd.io/",
     "SanicBoom.static": "http://CHANGE-HERE.rtfd.io/",
 }
@@ -1,37 +1,172 @@
+import asyncio
+import typing as t
+
 from sanic.request import Request
-from sanic_ipware import get_client_ip
 
-from sanic_boom.utils import REQUEST_CACHE_KEY
+from sanic_boom.proxies import ProxyConfig
+from sanic_boom.store import MISSING
+from sanic_boom.utils import COMPONENT_TRACE_KEY
+
+STREAM_HIGH_WATER = 64 * 1024
+
+
+class RequestStream(asyncio.Queue):
+    """The body of a request to a ``stream=True`` route, as an async iterator
+    of ``bytes`` chunks. It is still the queue Sanic fills (so
+    ``await request.stream.get()`` works as usual), but it keeps count of the
+    buffered bytes: once they go over the high-water mark the transport stops
+    reading from the socket, and it resumes only when the handler consumed
+    the buffer down to the low-water mark (a quarter of the high-water mark
+    by default).
+    """
+
+    def __init__(
+        self,
+        transport=None,
+        high_water: int = STREAM_HIGH_WATER,
+        low_water: t.Optional[int] = None,
+    ):
+        super().__init__()
+        self.transport = transport
+        self.buffered = 0
+        self.paused = False
+        self.finished = False
+        self.set_water_marks(high_water, low_water)
+
+    def set_water_marks(
+        self, high_water: int, low_water: t.Optional[int] = None
+    ):
+        if low_water is None:
+            low_water = high_water // 4
+        if not 0 <= low_water <= high_water:
+            raise ValueError(
+                "The water marks must satisfy 0 <= low_water <= high_water"
+            )
+        self.high_water = high_water
+        self.low_water = low_water
+        self._flow_control()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> bytes:
+        if self.finished:
+            raise StopAsyncIteration
+        chunk = await self.get()
+        if chunk is None:
+            self.finished = True
+            raise StopAsyncIteration
+        return chunk
+
+    # ----------------------------------------------------------------------- #
+    # asyncio.Queue hooks
+
+    def _put(self, item):
+        super()._put(item)
+        if item:
+            self.buffered += len(item)
+            self._flow_control()
+
+    def _get(self):
+        item = super()._get()
+        if item:
+            self.buffered -= len(item)
+            self._flow_control()
+        return item
+
+    def _flow_control(self):
+        if self.transport is None:
+            return
+        if not self.paused and self.buffered > self.high_water:
+            self.paused = True
+            self.transport.pause_reading()
+        elif self.paused and self.buffered <= self.low_water:
+            self.paused = False
+            self.transport.resume_reading()
+
+
+class ComponentValues(list):
+    """The ``REQUEST`` cached component values of a request, indexed by the
+    id :meth:`CacheEngine.request_index` gave to each parameter (when the
+    injection plans were compiled), so a hit is a single list lookup. Unset
+    indexes hold ``MISSING``.
+    """
+
+    __slots__ = ("params",)
+
+    def __init__(self, params: t.List[t.Any]):
+        # the parameters (by index) known so far, shared with the engine
+        super().__init__([MISSING] * len(params))
+        self.params = params
+
+    def get(self, index: int, default: t.Any = None) -> t.Any:
+        try:
+            value = self[index]
+        except IndexError:
+            return default
+        return default if value is MISSING else value
+
+    def __setitem__(self, index: int, value: t.Any):
+        if index >= len(self):
+            self.extend([MISSING] * (index + 1 - len(self)))
+        super().__setitem__(index, value)
+
+    def __delitem__(self, index: int):
+        super().__setitem__(index, MISSING)
+
+    def as_dict(self) -> t.Dict[t.Any, t.Any]:
+        return {
+            self.params[index]: value
+            for index, value in enumerate(self)
+            if value is not MISSING
+        }
 
 
 class BoomRequest(Request):
+    # (RouteChain, params) when matched ahead of time, see
+    # BoomRouter.is_stream_handler
+    route_match = None
+    # created on the first REQUEST cached component and released by
+    # SanicBoom.handle_request once the response is written
+    component_values = None
+
+    @property
+    def stream(self) -> t.Optional[RequestStream]:
+        return self._stream
+
+    @stream.setter
+    def stream(self, value):
+        # Sanic sets a plain asyncio.Queue for streaming handlers
+        if type(value) is asyncio.Queue:
+            value = RequestStream(self.transport)
+        self._stream = value
+
     @property
     def remote_addr(self):
-        if not hasattr(self, "_remote_addr"):
-            proxy_count = None
-            proxy_trusted_ips = None
-            request_header_order = None
-            if self.app and self.app.config:
-                proxy_count = getattr(
-                    self.app.config, "IPWARE_PROXY_COUNT", None
-                )
-                proxy_trusted_ips = getattr(
-                    self.app.config, "IPWARE_PROXY_TRUSTED_IPS", None
-                )
-                request_header_order = getattr(
-                    self.app.config, "IPWARE_REQUEST_HEADER_ORDER", None
-                )
-            ip, _ = get_client_ip(
-                self,
-                proxy_count=proxy_count,
-                proxy_trusted_ips=proxy_trusted_ips,
-                request_header_order=request_header_order,
+        try:
+            return self._remote_addr
+        except AttributeError:
+            pass
+        app = self.app
+        proxy_config = getattr(app, "proxy_config", None)
+        if proxy_config is None:
+            # compiled once, usually by SanicBoom.finalize
+            proxy_config = ProxyConfig.from_config(
+                getattr(app, "config", None)
             )
-            self._remote_addr = ip
+            if app:
+                app.proxy_config = proxy_config
+        self._remote_addr = proxy_config.get_client_ip(self.headers)
         return self._remote_addr
 
     @property
     def components(self):
-        if REQUEST_CACHE_KEY in self:
-            return self[REQUEST_CACHE_KEY]
-        return None
+        if self.component_values is None:
+            return None
+        return self.component_values.as_dict()
+
+    @property
+    def component_trace(self):
+        # the components resolved for this request, in the order they were
+        # resolved, when CacheEngine.tracing is enabled
+        return self.get(COMPONENT_TRACE_KEY)
@@ -1,19 +1,127 @@
+import asyncio
 import inspect
 import typing as t
-from functools import lru_cache
+from collections import namedtuple
+from enum import IntEnum
 
 from sanic.log import logger
 from sanic.request import Request
 
-from sanic_boom.component import Component
-from sanic_boom.exceptions import InvalidComponent, NoApplicationFound
-from sanic_boom.request import BoomRequest
+from sanic_boom.component import Component, ComponentCache
+from sanic_boom.converters import ConverterRegistry
+from sanic_boom.exceptions import (
+    CircularDependency,
+    InvalidComponent,
+    InvalidParameter,
+    NoApplicationFound,
+)
+from sanic_boom.request import STREAM_HIGH_WATER, BoomRequest, RequestStream
+from sanic_boom.store import MISSING, MemoryStore
+from sanic_boom.utils import param_parser
+
+
+class SlotKind(IntEnum):
+    REQUEST = 1
+    SOURCE_PARAM = 2
+    COMPONENT = 3
+    VIEW_REQUEST = 4
+    UNRESOLVED = 5
+    STREAM = 6
+
+
+# a slot is always checked against the prefetched values first (route params,
+# the response for response middlewares, etc), and only then by its kind;
+# component slots of REQUEST cached components also carry their index in
+# BoomRequest.component_values
+Slot = namedtuple("Slot", ("kind", "name", "param", "component", "index"))
+Slot.__new__.__defaults__ = (None,)
+
+
+class InjectionPlan:
+    __slots__ = ("func", "slots", "branches", "converters")
+
+    def __init__(
+        self,
+        func: t.Callable,
+        slots: t.Tuple[Slot, ...],
+        branches: t.Tuple[t.Tuple[Slot, ...], ...] = (),
+        converters: t.Dict[str, t.Callable[[t.Any], t.Any]] = None,
+    ):
+        self.func = func
+        self.slots = slots
+        # component slots grouped by shared (cached) dependencies: slots of
+        # the same branch are resolved in order, branches run concurrently
+        self.branches = branches
+        # for the slots that convert their prefetched values (route params)
+        self.converters = converters or {}
+
+    def __repr__(self):
+        return "<InjectionPlan for: {}, slots: {}>".format(
+            getattr(self.func, "__qualname__", self.func),
+            [(s.name, s.kind.name) for s in self.slots],
+        )
+
+
+class ComponentIndex:
+    """The components (and their registration order) indexed by their match
+    keys, plus the ones that can only be asked through ``resolve``."""
+
+    __slots__ = ("names", "annotations", "origins", "predicates")
+
+    def __init__(self, components: t.List[Component]):
+        self.names = {}
+        self.annotations = {}
+        self.origins = {}
+        self.predicates = []
+
+        for position, component in enumerate(components):
+            keys = component.get_match_keys()
+            if keys is None:
+                self.predicates.append((position, component))
+                continue
+            entry = (position, component)
+            for name in keys.names:
+                self.names.setdefault(name, entry)
+            for annotation in keys.annotations:
+                self.annotations.setdefault(annotation, entry)
+            for origin in keys.origins:
+                self.origins.setdefault(origin, entry)
+
+    def lookup(
+        self, param: inspect.Parameter
+    ) -> t.Optional[t.Tuple[int, Component]]:
+        annotation = param.annotation
+        candidates = [self.names.get(param.name)]
+        try:
+            candidates.append(self.annotations.get(annotation))
+        except TypeError:  # not hashable
+            pass
+        origin = getattr(annotation, "__origin__", None)
+        if origin is not None:
+            try:
+                candidates.append(self.origins.get(origin))
+            except TypeError:
+                pass
+        return min(
+            (c for c in candidates if c is not None),
+            key=lambda c: c[0],
+            default=None,
+        )
 
 
 class Resolver:
     def __init__(self, app=None):
         self.app = app
         self.components = []
+        self.converters = ConverterRegistry()
+        self._index = None
+        config = getattr(app, "config", None) or {}
+        # parameter -> component (or None), a bounded cache of its own
+        self._matches = MemoryStore(
+            max_entries=config.get("BOOM_RESOLVER_CACHE_SIZE", 768)
+        )
+        self._plans = {}
+        self._compiling = set()
 
     def add_component(self, component: Component):
         if self.app is None:
@@ -22,60 +130,117 @@ class Resolver:
             raise InvalidComponent()
 
         self.components.append(component(self.app))
+        # plans hold references to the components found at compile time
+        self.clear()
+
+    def add_converter(
+        self, annotation: t.Any, converter: t.Callable[[str], t.Any]
+    ):
+        self.converters.register(annotation, converter)
+        self._plans.clear()
+
+    def clear(self):
+        self._index = None
+        self._matches.clear()
+        self._plans.clear()
+
+    def set_cache_size(self, size: t.Optional[int]):
+        self._matches.resize(size)
+
+    def cache_info(self) -> t.Dict[str, t.Any]:
+        return {"plans": len(self._plans), "matches": self._matches.stats()}
 
-    @lru_cache(maxsize=768)
     def find_component(self, *, param: inspect.Parameter) -> Component:
-        for component in self.components:
-            resolved = component.resolve(param)
-            if resolved:
+        try:
+            component = self._matches.lookup(param)
+        except TypeError:  # unhashable annotations can't be cached
+            return self._find_component(param)
+        if component is MISSING:
+            component = self._find_component(param)
+            self._matches.set(param, component)
+        return component
+
+    def _find_component(self, param: inspect.Parameter) -> Component:
+        index = self._index
+        if index is None:
+            index = self._index = ComponentIndex(self.components)
+
+        # the first registered component resolving the parameter wins, be it
+        # found in the indexes or by calling its resolve method
+        found = index.lookup(param)
+        for position, component in index.predicates:
+            if found is not None and position > found[0]:
+                break
+            if component.resolve(param):
                 return component
-        return None
+        return found[1] if found is not None else None
 
-    async def resolve(
-        self,
-        *,
-        request: t.Union[Request, BoomRequest],
-        func: t.Callable,
-        prefetched: t.Dict[str, t.Any] = None,
-        source_param: inspect.Parameter = None
-    ) -> t.Dict[str, t.Any]:
+    def compile(self, func: t.Callable) -> InjectionPlan:
         if not inspect.isfunction(func) and not inspect.iscoroutinefunction(
             func
         ):
             raise TypeError('The provided parameter "func" is not a function')
-        kwargs = {}
-        params = inspect.signature(func).parameters
+        self._compiling.add(func)
+        try:
+            slots = self._compile_slots(func)
+            branches = self._compile_branches(
+                [s for s in slots if s.kind is SlotKind.COMPONENT]
+            )
+        finally:
+            self._compiling.discard(func)
+        converters = {}
+        for slot in slots:
+            converter = self._compile_converter(slot.param)
+            if converter is not None:
+                converters[slot.name] = converter
+        return InjectionPlan(func, slots, branches, converters)
 
-        for param in params.values():
+    def _compile_converter(
+        self, param: inspect.Parameter
+    ) -> t.Optional[t.Callable[[t.Any], t.Any]]:
+        parser = getattr(self.app, "param_parser", param_parser)
+        if parser is param_parser:
+            return self.converters.find(param.annotation)
 
-            if prefetched is not None and param.name in prefetched:
-                kwargs.update(
-                    {
-                        param.name: self.app.param_parser(
-                            prefetched.get(param.name), param
-                        )
-                    }
-                )
-                continue
+        # a custom parser is called for every value, as it always was
+        def convert(value):
+            return parser(value, param)
+
+        return convert
+
+    def _compile_slots(self, func: t.Callable) -> t.Tuple[Slot, ...]:
+        slots = []
+
+        for param in inspect.signature(func).parameters.values():
 
             if (
                 inspect.isclass(param.annotation)
                 and issubclass(param.annotation, Request)
             ) or param.name in ("request", "req"):
-                kwargs.update({param.name: request})
+                slots.append(Slot(SlotKind.REQUEST, param.name, param, None))
+                continue
+
+            if inspect.isclass(param.annotation) and issubclass(
+                param.annotation, RequestStream
+            ):
+                slots.append(Slot(SlotKind.STREAM, param.name, param, None))
                 continue
 
             if isinstance(
                 param.annotation, inspect.Parameter
             ) or param.name in ("param", "parameter"):
-                kwargs.update({param.name: source_param or param})
+                slots.append(
+                    Slot(SlotKind.SOURCE_PARAM, param.name, param, None)
+                )
                 continue
 
             if param.kind == param.VAR_POSITIONAL:  # equals *args, *a
                 # this is only valid for HTTPMethodView
                 if hasattr(func, "view_class"):
                     # most likely request is the only thing missing here
-                    kwargs.update({"request": request})
+                    slots.append(
+                        Slot(SlotKind.VIEW_REQUEST, "request", param, None)
+                    )
                 else:
                     logger.debug(
                         "Parameter '{}' skipped from resolver".format(
@@ -93,17 +258,256 @@ class Resolver:
             component = self.find_component(param=param)
 
             if component is None:
-                raise ValueError(
-                    'The requested parameter "{}" could not be resolved to a '
-                    "component".format(param.name)
+                # it may still be provided as a prefetched value, so the error
+                # can only be raised when the plan is executed
+                slots.append(
+                    Slot(SlotKind.UNRESOLVED, param.name, param, None)
                 )
             else:
-                value = await self.app.cache_engine.get(
-                    component, func, request, param or source_param
+                index = None
+                if component.get_cache_lifecycle() == ComponentCache.REQUEST:
+                    index = self.app.cache_engine.request_index(param)
+                slots.append(
+                    Slot(
+                        SlotKind.COMPONENT, param.name, param, component, index
+                    )
                 )
-                kwargs.update({param.name: value})
+
+        return tuple(slots)
+
+    def _compile_branches(
+        self, slots: t.List[Slot]
+    ) -> t.Tuple[t.Tuple[Slot, ...], ...]:
+        # slots that (even transitively) share a cached component must be
+        # resolved one after another, so it gets evaluated only once
+        branches = []
+
+        for slot in slots:
+            nodes = self._cached_nodes(slot)
+            merged = [slot]
+
+            for branch in branches[:]:
+                if branch[0] & nodes:
+                    nodes |= branch[0]
+                    merged = branch[1] + merged
+                    branches.remove(branch)
+
+            branches.append((nodes, merged))
+
+        return tuple(
+            tuple(sorted(merged, key=slots.index)) for _, merged in branches
+        )
+
+    def _cached_nodes(self, slot: Slot, path: tuple = ()) -> t.Set[tuple]:
+        component = slot.component
+        nodes = set()
+
+        if component.get_cache_lifecycle() != ComponentCache.NO_CACHE:
+            nodes.add((component, slot.param))
+
+        # the components being compiled (or walked, once their plans are
+        # cached) up to this one; meeting one of them again never ends
+        if component.get in self._compiling or component.get in path:
+            raise CircularDependency(
+                getattr(component.get, "__qualname__", repr(component.get)),
+                slot.name,
+            )
+
+        path += (component.get,)
+        for dependency in self.get_plan(component.get).branches:
+            for dependency_slot in dependency:
+                nodes |= self._cached_nodes(dependency_slot, path)
+
+        return nodes
+
+    def get_plan(self, func: t.Callable) -> InjectionPlan:
+        try:
+            return self._plans[func]
+        except (KeyError, TypeError):
+            plan = self.compile(func)
+            self._plans[func] = plan
+            return plan
+
+    async def resolve(
+        self,
+        *,
+        request: t.Union[Request, BoomRequest],
+        func: t.Callable,
+        prefetched: t.Dict[str, t.Any] = None,
+        source_param: inspect.Parameter = None
+    ) -> t.Dict[str, t.Any]:
+        kwargs = {}
+        plan = self.get_plan(func)
+
+        for slot in plan.slots:
+            name = slot.name
+
+            if prefetched is not None and name in prefetched:
+                value = prefetched[name]
+                converter = plan.converters.get(name)
+                if converter is not None:
+                    try:
+                        value = converter(value)
+                    except (ValueError, TypeError):
+                        raise InvalidParameter(name, value) from None
+                kwargs[name] = value
+                continue
+
+            kind = slot.kind
+
+            if kind is SlotKind.COMPONENT:
+                continue  # resolved below, by branch
+            elif kind is SlotKind.REQUEST or kind is SlotKind.VIEW_REQUEST:
+                kwargs[name] = request
+            elif kind is SlotKind.SOURCE_PARAM:
+                kwargs[name] = source_param or slot.param
+            elif kind is SlotKind.STREAM:
+                kwargs[name] = self._get_stream(request, name)
+            else:
+                raise ValueError(
+                    'The requested parameter "{}" could not be resolved to a '
+                    "component".format(name)
+                )
+
+        if len(plan.branches) == 1:
+            await self._resolve_branch(
+                plan.branches[0], func, request, prefetched, kwargs
+            )
+        elif plan.branches:
+            await self._resolve_branches(
+                plan.branches, func, request, prefetched, kwargs
+            )
 
         return kwargs
 
+    def _get_stream(
+        self, request: t.Union[Request, BoomRequest], name: str
+    ) -> RequestStream:
+        stream = getattr(request, "stream", None)
+        if not isinstance(stream, RequestStream):
+            raise ValueError(
+                'The requested parameter "{}" is a request stream, only '
+                'available for routes registered with "stream=True"'.format(
+                    name
+                )
+            )
+        config = getattr(self.app, "config", None) or {}
+        stream.set_water_marks(
+            config.get("BOOM_STREAM_HIGH_WATER", STREAM_HIGH_WATER),
+            config.get("BOOM_STREAM_LOW_WATER"),
+        )
+        return stream
+
+    async def _resolve_branches(
+        self,
+        branches: t.Tuple[t.Tuple[Slot, ...], ...],
+        func: t.Callable,
+        request: t.Union[Request, BoomRequest],
+        prefetched: t.Optional[t.Dict[str, t.Any]],
+        kwargs: t.Dict[str, t.Any],
+    ):
+        engine = self.app.cache_engine
+        if engine.tracing or engine.sink is not None:
+            # tracing tells cache misses apart by task, one per branch
+            await _run_concurrently(
+                [
+                    self._resolve_branch(
+                        branch, func, request, prefetched, kwargs
+                    )
+                    for branch in branches
+                ]
+            )
+            return
+
+        # every branch runs inline until it has to wait for something (cache
+        # hits never do), only the ones left waiting then run concurrently
+        pending = []
+        try:
+            for branch in branches:
+                coro = self._resolve_branch(
+                    branch, func, request, prefetched, kwargs
+                )
+                try:
+                    pending.append(_Suspended(coro, coro.send(None)))
+                except StopIteration:
+                    pass
+        except BaseException:
+            await _run_concurrently(
+                [suspended.abort() for suspended in pending],
+                return_exceptions=True,
+            )
+            raise
+
+        if len(pending) == 1:
+            await pending[0]
+        elif pending:
+            await _run_concurrently(pending)
+
+    async def _resolve_branch(
+        self,
+        branch: t.Tuple[Slot, ...],
+        func: t.Callable,
+        request: t.Union[Request, BoomRequest],
+        prefetched: t.Optional[t.Dict[str, t.Any]],
+        kwargs: t.Dict[str, t.Any],
+    ):
+        for slot in branch:
+            if prefetched is not None and slot.name in prefetched:
+                continue
+            kwargs[slot.name] = await self.app.cache_engine.get(
+                slot.component, func, request, slot.param, slot.index
+            )
+
+
+class _Suspended:
+    """A coroutine stepped by hand up to its first suspension, on
+    ``yielded``, that can still be awaited (or wrapped in a task) to run it
+    to the end."""
+
+    __slots__ = ("coro", "yielded")
+
+    def __init__(self, coro: t.Coroutine, yielded: t.Any):
+        self.coro = coro
+        self.yielded = yielded
+
+    def __await__(self):
+        coro, yielded = self.coro, self.yielded
+        while True:
+            try:
+                sent = yield yielded
+            except BaseException as e:
+                step, value = coro.throw, e
+            else:
+                step, value = coro.send, sent
+            try:
+                yielded = step(value)
+            except StopIteration as stop:
+                return stop.value
+
+    async def abort(self):
+        """Cancels the coroutine, as a cancelled task would."""
+        if isinstance(self.yielded, asyncio.Future):
+            self.yielded.cancel()
+        try:
+            self.yielded = self.coro.throw(asyncio.CancelledError())
+        except (StopIteration, asyncio.CancelledError):
+            return
+        await self  # it handled the cancellation and carried on
+
+
+async def _run_concurrently(
+    awaitables: t.List[t.Awaitable], return_exceptions: bool = False
+):
+    """Like ``asyncio.gather``, but if any of them fails (or this gets
+    cancelled) the others are cancelled and awaited before raising."""
+    tasks = [asyncio.ensure_future(awaitable) for awaitable in awaitables]
+    try:
+        await asyncio.gather(*tasks, return_exceptions=return_exceptions)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
 
-__all__ = ("Resolver",)
+__all__ = ("InjectionPlan", "Resolver", "SlotKind")
@@ -1,20 +1,75 @@
 import re
-import warnings
 from collections.abc import Iterable
-from functools import lru_cache
 
 from sanic.exceptions import MethodNotSupported, NotFound
+from sanic.response import HTTPResponse
 from sanic.router import ROUTER_CACHE_SIZE, RouteExists
 from xrtr import RadixTree
 
-from sanic_boom.references import DOC_LINKS as dl
-from sanic_boom.wrappers import Middleware, MiddlewareType, Route
+from sanic_boom.exceptions import RouterFrozen
+from sanic_boom.request import BoomRequest
+from sanic_boom.store import MISSING, MemoryStore
+from sanic_boom.wrappers import Middleware, MiddlewareType, Route, RouteChain
+
+
+class RouteMiss:
+    """A request that could not be routed, kept in the negative cache of the
+    router: the exception it would raise and the response the default error
+    handler would give it, already encoded (without echoing the URL)."""
+
+    __slots__ = ("method", "url", "allowed_methods", "status", "headers")
+
+    def __init__(self, method, url, allowed_methods=None):
+        self.method = method
+        self.url = url
+        self.allowed_methods = allowed_methods
+        if allowed_methods is None:
+            self.status = 404
+            self.headers = {}
+        else:
+            self.status = 405
+            self.headers = self.exception().headers
+
+    def exception(self):
+        if self.allowed_methods is None:
+            return NotFound("Requested URL {} not found".format(self.url))
+        return MethodNotSupported(
+            "Method {} not allowed for URL {}".format(self.method, self.url),
+            method=self.method,
+            allowed_methods=self.allowed_methods,
+        )
+
+    def response(self):
+        return HTTPResponse(
+            body_bytes=_MISS_BODIES[self.status],
+            status=self.status,
+            headers=self.headers,
+        )
+
+    def __repr__(self):
+        return "<RouteMiss {} {}: {}>".format(
+            self.method, self.url, self.status
+        )
+
+
+_MISS_BODIES = {404: b"Error: Not Found", 405: b"Error: Method Not Allowed"}
 
 
 class BoomRouter:
-    def __init__(self):
+    def __init__(self, cache_size=ROUTER_CACHE_SIZE):
         self._tree = RadixTree()
+        self._chains = {}
+        # routes without parameters never touch the tree, while matches of
+        # parametrized routes are kept in a bounded cache of their own
+        self._static = {}
+        self._dynamic = MemoryStore(max_entries=cache_size)
+        # misses have a bounded cache of their own, so junk requests never
+        # evict the matches
+        self._missing = MemoryStore(max_entries=cache_size)
+        self.frozen = False
         self.routes_names = {}
+        self.request_middleware = ()
+        self.response_middleware = ()
 
     def add(
         self,
@@ -29,6 +84,9 @@ class BoomRouter:
         attach_to=MiddlewareType.REQUEST,
         **kwargs  # ! is this necessary yet?
     ):
+        if self.frozen:
+            raise RouterFrozen()
+
         # uri "normalization", there is no strict slashes for mental sakeness
         uri = uri.strip()
 
@@ -84,9 +142,93 @@ class BoomRouter:
                 self._tree.insert(path=uri, handler=route, methods=methods)
                 self.routes_names[handler_name] = (uri, route)
 
+                if not route.params:
+                    static = self._static.setdefault(uri, {})
+                    for method in methods:
+                        static[method] = route
+
         except KeyError as ke:
             raise RouteExists from ke
 
+        # any new route or middleware may change the existing chains
+        self.clear_chains()
+
+    def set_global_middlewares(self, request_middleware, response_middleware):
+        request_middleware = tuple(request_middleware)
+        response_middleware = tuple(response_middleware)
+
+        if (
+            request_middleware != self.request_middleware
+            or response_middleware != self.response_middleware
+        ):
+            if self.frozen:
+                raise RouterFrozen()
+            self.request_middleware = request_middleware
+            self.response_middleware = response_middleware
+            self.clear_chains()
+
+    def freeze(self):
+        self.frozen = True
+
+    def clear_chains(self):
+        self._chains.clear()
+        self._missing.clear()
+        self._dynamic.clear()
+
+    def build_chains(self):
+        for _, route in self.routes_names.values():
+            for method in route.methods:
+                self._get_chain(route, method)
+        return self._chains
+
+    def set_cache_size(self, size):
+        self._dynamic.resize(size)
+        self._missing.resize(size)
+
+    def cache_info(self):
+        return {
+            "static_routes": len(self._static),
+            "chains": len(self._chains),
+            "dynamic": self._dynamic.stats(),
+            "missing": self._missing.stats(),
+        }
+
+    def _get_chain(self, route, method):
+        key = (route, method)
+        chain = self._chains.get(key)
+
+        if chain is None:
+            # a route template always matches itself, with the same
+            # middlewares as any other url it matches
+            _, middlewares, _ = self._tree.get(route.uri, method)
+            # --------------------------------------------------------------- #
+            # code taken and adapted from the Sanic router
+            # --------------------------------------------------------------- #
+            route_handler = route.handler
+
+            if hasattr(route_handler, "handlers"):  # noqa
+                # W-W-WHY ?! I don't even know what this is or why is it here
+                route_handler = route_handler.handlers[method]
+
+            chain = RouteChain(
+                handler=route_handler,
+                uri=route.uri,
+                request_middlewares=self.request_middleware
+                + tuple(
+                    m.handler
+                    for m in middlewares
+                    if m.attach_to == MiddlewareType.REQUEST
+                ),
+                global_response_middlewares=self.response_middleware,
+                response_middlewares=tuple(
+                    m.handler
+                    for m in middlewares
+                    if m.attach_to == MiddlewareType.RESPONSE
+                ),
+            )
+            self._chains[key] = chain
+        return chain
+
     def find_route_by_view_name(self, view_name):
         # ------------------------------------------------------------------- #
         # code taken and adapted from the Sanic router
@@ -97,49 +239,86 @@ class BoomRouter:
         return self.routes_names.get(view_name, (None, None))
 
     def get(self, request):
-        return self._get(request.path, request.method)
+        match = self.match(request)
+        if match.__class__ is RouteMiss:
+            raise match.exception()
+        return match
+
+    def match(self, request):
+        """Same as :meth:`get`, but returning a :class:`RouteMiss` instead
+        of raising ``NotFound`` or ``MethodNotSupported``."""
+        # the route may have already been matched by is_stream_handler
+        match = getattr(request, "route_match", None)
+        if match is None:
+            return self._match(request.path, request.method)
+        return match
 
-    @lru_cache(maxsize=ROUTER_CACHE_SIZE)
     def _get(self, url, method):
+        match = self._match(url, method)
+        if match.__class__ is RouteMiss:
+            raise match.exception()
+        return match
+
+    def _match(self, url, method):
         # url "normalization", there is no strict slashes for mental sakeness
         url = url.strip()
 
         if url.count("/") > 1 and url[-1] == "/":
             url = url[:-1]  # yes, yes yes and yes! (:
-        route, middlewares, params = self._tree.get(url, method)
+
+        static = self._static.get(url)
+        if static is not None:
+            route = static.get(method)
+            if route is not None:
+                return self._get_chain(route, method), {}
+
+        key = (url, method)
+        match = self._dynamic.lookup(key)
+        if match is not MISSING:
+            return match
+        miss = self._missing.get(key)
+        if miss is not None:
+            return miss
+
+        route, _, params = self._tree.get(url, method)
 
         if route is self._tree.sentinel:
-            raise MethodNotSupported(
-                "Method {} not allowed for URL {}".format(method, url),
-                method=method,
-                allowed_methods=self.get_supported_methods(url),
-            )
+            miss = RouteMiss(method, url, self.get_supported_methods(url))
+            self._missing[key] = miss
+            return miss
         elif route is None:
-            raise NotFound("Requested URL {} not found".format(url))
-        # ------------------------------------------------------------------- #
-        # code taken and adapted from the Sanic router
-        # ------------------------------------------------------------------- #
-        route_handler = route.handler
+            miss = RouteMiss(method, url)
+            self._missing[key] = miss
+            return miss
 
-        if hasattr(route_handler, "handlers"):  # noqa
-            # W-W-WHY ?! I don't even know what this is or why is it here
-            route_handler = route_handler.handlers[method]
-        return route_handler, middlewares, params, route.uri
+        match = self._get_chain(route, method), params
+        self._dynamic[key] = match
+        return match
 
     def get_supported_methods(self, url):
         return self._tree.methods_for(url)
 
     def is_stream_handler(self, request):
-        warnings.warn(
-            "NOTE: this will always return False since it is called by "
-            "Server.on_headers_complete (which is prior to calling "
-            "Sanic.handle_request, that will again call Router.get, as the "
-            "original implementation of Sanic does). Something needs to "
-            "change so the Router.get method won't get called twice. Read "
-            "more here: {}".format(dl.get("Router.is_stream_handler")),
-            RuntimeWarning,
-        )
-        return False
+        """Called by the server as soon as the request headers are complete,
+        only if any route was registered with ``stream=True``. The match is
+        kept in the request, so the handler is not looked up again by
+        ``SanicBoom.handle_request``."""
+        match = self._match(request.path, request.method)
+        if match.__class__ is RouteMiss:
+            return False
+
+        if isinstance(request, BoomRequest):
+            request.route_match = match
+        handler = match[0].handler
+
+        # ------------------------------------------------------------------- #
+        # code taken and adapted from the Sanic router
+        # ------------------------------------------------------------------- #
+        if hasattr(handler, "view_class") and hasattr(
+            handler.view_class, request.method.lower()
+        ):
+            handler = getattr(handler.view_class, request.method.lower())
+        return hasattr(handler, "is_stream")
 
 
-__all__ = ("BoomRouter",)
+__all__ = ("BoomRouter", "RouteMiss")
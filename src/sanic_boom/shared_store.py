@@ -0,0 +1,486 @@
+import hashlib
+import mmap
+import os
+import pickle
+import stat
+import struct
+import threading
+import typing as t
+from multiprocessing import Lock
+from time import monotonic
+
+from sanic_boom.store import MISSING, MemoryStore
+
+# magic, version, slots, data size, data used
+_HEADER = struct.Struct("<8sIIQQ")
+_MAGIC = b"SBOOMSHM"
+_VERSION = 1
+_USED_OFFSET = 24
+_USED = struct.Struct("<Q")
+
+# sequence, key digest, expires at (0 means never), data offset, data length
+_SLOT = struct.Struct("<Q16sdQQ")
+_SEQUENCE = struct.Struct("<Q")
+_EMPTY = bytes(16)
+_EXPIRED = object()
+
+# how many slots a key may live in, starting from the one its digest points to
+_PROBES = 8
+# how many times a read is retried while a writer is changing the same slot
+_RETRIES = 4
+
+
+class _FileLock:
+    """An exclusive record lock (``lockf``) on the backing file, for
+    processes that don't share a parent (that could have created a
+    ``multiprocessing.Lock``). Unlike ``flock`` locks, that belong to the
+    open file and so are shared by the workers forked after it's opened,
+    record locks belong to each process; the threads of a process are kept
+    apart by a thread lock."""
+
+    def __init__(self, fd: int):
+        import fcntl
+
+        self._fcntl = fcntl
+        self._thread_lock = threading.Lock()
+        self.fd = fd
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        try:
+            self._fcntl.lockf(self.fd, self._fcntl.LOCK_EX)
+        except BaseException:
+            self._thread_lock.release()
+            raise
+
+    def __exit__(self, *exc_info):
+        try:
+            self._fcntl.lockf(self.fd, self._fcntl.LOCK_UN)
+        finally:
+            self._thread_lock.release()
+
+
+class SharedMemoryStore:
+    """A key/value store kept in shared memory, so every worker of the same
+    server reads the values computed (and pickled) by any of them, holding
+    a single copy of them.
+
+    Without a ``path``, the memory is an anonymous mapping inherited by the
+    processes forked after the store is created (the Sanic workers, if the
+    application is created in the main process); with a ``path``, a file
+    (preferably in ``/dev/shm``) is mapped, so unrelated processes can share
+    it as well. An existing file is only used if it's owned by the current
+    user and nobody else can write to it (nor is it a symbolic link), since
+    the values read from it are unpickled.
+
+    The segment is a fixed table of ``slots`` keys, pointing to the pickled
+    values in a data area of ``size`` bytes. Writes are serialized by a lock
+    and the data area is only appended to; when it's full, the live values
+    are compacted to its start, dropping the expired ones and then, if still
+    needed, the oldest ones. Reads take no lock at all: each slot has a
+    sequence number, odd while it's being written (or its data moved), and
+    a read is only valid if the number didn't change while the slot and its
+    data were being copied.
+
+    Each process keeps the values it decoded, along with the slot version
+    they came from, so reading a value that didn't change since only costs
+    checking the slot.
+
+    Keys are turned into digests by ``key_func`` (``repr`` by default), that
+    must give the same result in every process. Values that can't be
+    pickled, as well as the :class:`InFlight` placeholders of the cache
+    engine, are kept in a local :class:`MemoryStore` instead.
+
+    Only keys this process has stored or looked up can be matched by the
+    predicate given to :meth:`invalidate`; without a predicate, the whole
+    segment is cleared, for every process.
+    """
+
+    def __init__(
+        self,
+        size: int = 16 * 1024 * 1024,
+        slots: int = 1024,
+        ttl: t.Optional[float] = None,
+        path: t.Optional[str] = None,
+        key_func: t.Callable[[t.Any], str] = repr,
+    ):
+        self.ttl = ttl
+        self.path = path
+        self.key_func = key_func
+        self.local = MemoryStore(max_entries=slots, ttl=ttl)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._keys = {}
+        # digest: ((slot index, sequence, offset), decoded value)
+        self._decoded = {}
+        self._fd = None
+
+        if path is None:
+            self._map = mmap.mmap(-1, self._total_size(slots, size))
+            self._lock = Lock()
+            self._initialize(slots, size)
+        else:
+            self._fd = os.open(
+                path,
+                os.O_RDWR | os.O_CREAT | getattr(os, "O_NOFOLLOW", 0),
+                0o600,
+            )
+            try:
+                self._lock = _FileLock(self._fd)
+                self._check_owner(os.fstat(self._fd))
+                with self._lock:
+                    if os.fstat(self._fd).st_size == 0:
+                        os.ftruncate(self._fd, self._total_size(slots, size))
+                        self._map = mmap.mmap(self._fd, 0)
+                        self._initialize(slots, size)
+                    else:
+                        # the geometry of an existing segment always wins
+                        self._map = mmap.mmap(self._fd, 0)
+                        slots, size = self._read_header()
+            except BaseException:
+                os.close(self._fd)
+                raise
+
+        self.slots = slots
+        self.data_size = size
+        self._data_start = _HEADER.size + slots * _SLOT.size
+
+    # ----------------------------------------------------------------------- #
+    # "public" methods
+
+    def lookup(self, key: t.Any) -> t.Any:
+        value = self.get(key, MISSING)
+        if value is MISSING:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key: t.Any, value: t.Any, ttl: t.Optional[float] = None):
+        if ttl is None:
+            ttl = self.ttl
+        try:
+            data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        except Exception:  # futures, locks, connections, ...
+            self.local.set(key, value, ttl=ttl)
+            return
+
+        if key in self.local:
+            del self.local[key]
+        if len(data) > self.data_size:
+            self.local.set(key, value, ttl=ttl)
+            return
+
+        digest = self._digest(key)
+        expires_at = monotonic() + ttl if ttl is not None else 0.0
+        with self._lock:
+            used = _USED.unpack_from(self._map, _USED_OFFSET)[0]
+            if used + len(data) > self.data_size:
+                used = self._compact(len(data))
+            # the data is in place before any slot points to it
+            offset = self._data_start + used
+            self._map[offset : offset + len(data)] = data
+            _USED.pack_into(self._map, _USED_OFFSET, used + len(data))
+            self._write_slot(
+                self._free_slot(digest), digest, expires_at, offset, len(data)
+            )
+
+    def invalidate(
+        self, predicate: t.Optional[t.Callable[[t.Any], bool]] = None
+    ) -> int:
+        if predicate is None:
+            count = len(self)
+            self.local.clear()
+            self._decoded.clear()
+            with self._lock:
+                self._reset()
+            return count
+
+        count = self.local.invalidate(predicate)
+        for digest, key in list(self._keys.items()):
+            if predicate(key):
+                del self._keys[digest]
+                self._decoded.pop(digest, None)
+                with self._lock:
+                    index = self._find_slot(digest)
+                    if index is not None:
+                        self._write_slot(index, _EMPTY, 0.0, 0, 0)
+                        count += 1
+        return count
+
+    def stats(self) -> t.Dict[str, int]:
+        return {
+            "entries": len(self),
+            "size": _USED.unpack_from(self._map, _USED_OFFSET)[0],
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+    def close(self):
+        self._decoded.clear()
+        self._map.close()
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    # ----------------------------------------------------------------------- #
+    # mapping methods
+
+    def get(self, key: t.Any, default: t.Any = None) -> t.Any:
+        value = self.local.get(key, MISSING)
+        if value is not MISSING:
+            return value
+
+        value = self._read(self._digest(key))
+        if value is MISSING:
+            return default
+        if value is _EXPIRED:
+            self.expirations += 1
+            return default
+        return value
+
+    def __getitem__(self, key: t.Any) -> t.Any:
+        value = self.get(key, MISSING)
+        if value is MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: t.Any, value: t.Any):
+        self.set(key, value)
+
+    def __delitem__(self, key: t.Any):
+        if key in self.local:
+            del self.local[key]
+            return
+        digest = self._digest(key)
+        with self._lock:
+            index = self._find_slot(digest)
+            if index is None:
+                raise KeyError(key)
+            self._write_slot(index, _EMPTY, 0.0, 0, 0)
+
+    def __contains__(self, key: t.Any) -> bool:
+        return self.get(key, MISSING) is not MISSING
+
+    def __len__(self) -> int:
+        now = monotonic()
+        count = len(self.local)
+        for index in range(self.slots):
+            _, digest, expires_at, _, _ = _SLOT.unpack_from(
+                self._map, _HEADER.size + index * _SLOT.size
+            )
+            if digest != _EMPTY and (not expires_at or expires_at > now):
+                count += 1
+        return count
+
+    def clear(self):
+        self.invalidate()
+
+    # ----------------------------------------------------------------------- #
+    # "internal" methods
+
+    @staticmethod
+    def _total_size(slots: int, size: int) -> int:
+        return _HEADER.size + slots * _SLOT.size + size
+
+    def _initialize(self, slots: int, size: int):
+        _HEADER.pack_into(self._map, 0, _MAGIC, _VERSION, slots, size, 0)
+
+    def _check_owner(self, file_stat: os.stat_result):
+        """Values are unpickled from the file, so it must be a regular file
+        only this user can write to (not one planted by another user of a
+        shared directory like ``/dev/shm``)."""
+        if (
+            not stat.S_ISREG(file_stat.st_mode)
+            or file_stat.st_uid != os.geteuid()
+            or file_stat.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+        ):
+            raise PermissionError(
+                "{} must be a regular file owned by the current user and "
+                "writable by it only".format(self.path)
+            )
+
+    def _read_header(self) -> t.Tuple[int, int]:
+        if len(self._map) < _HEADER.size:
+            raise ValueError(
+                "{} is not a sanic-boom shared store".format(self.path)
+            )
+        magic, version, slots, size, _ = _HEADER.unpack_from(self._map, 0)
+        if (
+            magic != _MAGIC
+            or version != _VERSION
+            or len(self._map) < self._total_size(slots, size)
+        ):
+            raise ValueError(
+                "{} is not a sanic-boom shared store".format(self.path)
+            )
+        return slots, size
+
+    def _digest(self, key: t.Any) -> bytes:
+        digest = hashlib.md5(self.key_func(key).encode()).digest()
+        # kept to match the predicates given to invalidate
+        self._keys[digest] = key
+        return digest
+
+    def _probe(self, digest: bytes) -> t.Iterator[int]:
+        start = int.from_bytes(digest[:8], "little") % self.slots
+        for i in range(min(_PROBES, self.slots)):
+            yield (start + i) % self.slots
+
+    def _read(self, digest: bytes) -> t.Any:
+        """Returns the value stored for ``digest``, ``MISSING`` if there is
+        none or ``_EXPIRED``. The data is only copied and unpickled if the
+        slot changed since this process last read it. Lock free."""
+        buffer = self._map
+        for index in self._probe(digest):
+            position = _HEADER.size + index * _SLOT.size
+            for _ in range(_RETRIES):
+                slot = _SLOT.unpack_from(buffer, position)
+                sequence, slot_digest, expires_at, offset, length = slot
+                if sequence & 1:
+                    continue  # being written right now
+                if slot_digest != digest:
+                    break
+                version = (index, sequence, offset)
+                decoded = self._decoded.get(digest)
+                if decoded is not None and decoded[0] == version:
+                    data = None
+                else:
+                    data = buffer[offset : offset + length]
+                if _SEQUENCE.unpack_from(buffer, position)[0] != sequence:
+                    continue  # changed while copying
+                if expires_at and expires_at <= monotonic():
+                    return _EXPIRED
+                if data is None:
+                    return decoded[1]
+                value = pickle.loads(data)
+                if len(self._decoded) >= self.slots:
+                    self._decoded.clear()  # mostly values long replaced
+                self._decoded[digest] = (version, value)
+                return value
+        return MISSING
+
+    def _find_slot(self, digest: bytes) -> t.Optional[int]:
+        for index in self._probe(digest):
+            position = _HEADER.size + index * _SLOT.size
+            if self._map[position + 8 : position + 24] == digest:
+                return index
+        return None
+
+    def _free_slot(self, digest: bytes) -> int:
+        """The slot of ``digest``, or else an empty (or expired) one, or else
+        the first one it may live in, that gets evicted."""
+        index = self._find_slot(digest)
+        if index is not None:
+            return index
+        now = monotonic()
+        candidates = list(self._probe(digest))
+        for index in candidates:
+            _, slot_digest, expires_at, _, _ = _SLOT.unpack_from(
+                self._map, _HEADER.size + index * _SLOT.size
+            )
+            if slot_digest == _EMPTY or (expires_at and expires_at <= now):
+                return index
+        self.evictions += 1
+        return candidates[0]
+
+    def _write_slot(
+        self,
+        index: int,
+        digest: bytes,
+        expires_at: float,
+        offset: int,
+        length: int,
+    ):
+        position = _HEADER.size + index * _SLOT.size
+        sequence = _SEQUENCE.unpack_from(self._map, position)[0]
+        _SEQUENCE.pack_into(self._map, position, sequence + 1)
+        _SLOT.pack_into(
+            self._map,
+            position,
+            sequence + 1,
+            digest,
+            expires_at,
+            offset,
+            length,
+        )
+        _SEQUENCE.pack_into(self._map, position, sequence + 2)
+
+    def _compact(self, needed: int) -> int:
+        """Moves the live values to the start of the data area, dropping the
+        expired ones and then the oldest ones until ``needed`` more bytes
+        fit, and returns the bytes used. Must hold the lock."""
+        now = monotonic()
+        live = []
+        for index in range(self.slots):
+            _, digest, expires_at, offset, length = _SLOT.unpack_from(
+                self._map, _HEADER.size + index * _SLOT.size
+            )
+            if digest == _EMPTY:
+                continue
+            if expires_at and expires_at <= now:
+                self._write_slot(index, _EMPTY, 0.0, 0, 0)
+            else:
+                live.append((offset, length, index))
+        # the data area is appended to, so the oldest values come first
+        live.sort()
+        used = sum(length for _, length, _ in live)
+        while live and used + needed > self.data_size:
+            _, length, index = live.pop(0)
+            self._write_slot(index, _EMPTY, 0.0, 0, 0)
+            self.evictions += 1
+            used -= length
+
+        # every value moves down (or stays), never over one not moved yet
+        cursor = self._data_start
+        for offset, length, index in live:
+            if offset != cursor:
+                position = _HEADER.size + index * _SLOT.size
+                sequence, digest, expires_at, _, _ = _SLOT.unpack_from(
+                    self._map, position
+                )
+                _SEQUENCE.pack_into(self._map, position, sequence + 1)
+                self._map[cursor : cursor + length] = self._map[
+                    offset : offset + length
+                ]
+                _SLOT.pack_into(
+                    self._map,
+                    position,
+                    sequence + 2,
+                    digest,
+                    expires_at,
+                    cursor,
+                    length,
+                )
+            cursor += length
+        used = cursor - self._data_start
+        _USED.pack_into(self._map, _USED_OFFSET, used)
+        return used
+
+    def _reset(self) -> int:
+        """Empties every slot, then the data area, returning how many live
+        values were dropped. Must hold the lock."""
+        now = monotonic()
+        count = 0
+        for index in range(self.slots):
+            _, digest, expires_at, _, _ = _SLOT.unpack_from(
+                self._map, _HEADER.size + index * _SLOT.size
+            )
+            if digest != _EMPTY:
+                self._write_slot(index, _EMPTY, 0.0, 0, 0)
+                # the expired ones don't count
+                count += not expires_at or expires_at > now
+        _USED.pack_into(self._map, _USED_OFFSET, 0)
+        return count
+
+    def __repr__(self):
+        return "<SharedMemoryStore entries: {}, size: {}, path: {}>".format(
+            len(self), self.data_size, self.path
+        )
+
+
+__all__ = ("SharedMemoryStore",)
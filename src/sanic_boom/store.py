@@ -0,0 +1,210 @@
+import sys
+import types
+import typing as t
+from collections import OrderedDict, deque
+from time import monotonic
+
+MISSING = object()
+
+_ATOMIC = (str, bytes, bytearray, int, float, complex, bool, type(None))
+# shared by everything, never owned by a cached value
+_SHARED = (type, types.ModuleType, types.FunctionType, types.MethodType)
+_CONTAINERS = (list, tuple, set, frozenset, deque)
+
+
+def deep_sizeof(value: t.Any) -> int:
+    """The approximate size of ``value`` and of everything it holds: the
+    builtin containers are walked all the way down, while other instances
+    only add their attributes, not what those hold (they may very well
+    reference the whole application). Each object is counted once; classes,
+    modules and functions are not counted."""
+    seen = set()
+    size = 0
+    stack = [value]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, _SHARED):
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        if isinstance(obj, _ATOMIC):
+            continue
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, _CONTAINERS):
+            stack.extend(obj)
+        else:
+            for attribute in _attributes(obj):
+                if id(attribute) not in seen and not isinstance(
+                    attribute, _SHARED
+                ):
+                    seen.add(id(attribute))
+                    size += sys.getsizeof(attribute)
+    return size
+
+
+def _attributes(obj: t.Any) -> t.Iterator[t.Any]:
+    attributes = getattr(obj, "__dict__", None)
+    if attributes is not None:
+        yield attributes
+        yield from attributes.values()
+    for name in getattr(type(obj), "__slots__", ()):
+        attribute = getattr(obj, name, MISSING)
+        if attribute is not MISSING:
+            yield attribute
+
+
+class MemoryStore:
+    """A simple in-memory key/value store with optional LRU eviction (by the
+    number of entries and/or their approximate size in bytes) and TTL
+    expiration (per store or per entry).
+
+    The size of each value is given by ``sizeof``, which defaults to
+    ``sys.getsizeof`` (the shallow size of the object only); the cache engine
+    uses :func:`deep_sizeof`, so ``max_bytes`` bounds what the values hold as
+    well. Sizes are only measured (and reported by :meth:`stats`) while
+    ``max_bytes`` is set.
+
+    The mapping methods (``store[key]``, ``store.get``, ``key in store``, etc)
+    are meant for the cache internals and don't count as hits or misses, only
+    :meth:`lookup` does.
+    """
+
+    def __init__(
+        self,
+        max_entries: t.Optional[int] = None,
+        ttl: t.Optional[float] = None,
+        max_bytes: t.Optional[int] = None,
+        sizeof: t.Callable[[t.Any], int] = sys.getsizeof,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sizeof = sizeof
+        self.size = 0
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    # ----------------------------------------------------------------------- #
+    # "public" methods
+
+    def lookup(self, key: t.Any) -> t.Any:
+        value = self.get(key, MISSING)
+        if value is MISSING:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._data.move_to_end(key)
+        return value
+
+    def set(self, key: t.Any, value: t.Any, ttl: t.Optional[float] = None):
+        if ttl is None:
+            ttl = self.ttl
+        expires_at = monotonic() + ttl if ttl is not None else None
+        size = self.sizeof(value) if self.max_bytes is not None else 0
+        if key in self._data:
+            self._remove(key)
+        self._data[key] = (value, expires_at, size)
+        self.size += size
+        self._evict()
+
+    def resize(self, max_entries: t.Optional[int]):
+        self.max_entries = max_entries
+        self._evict()
+
+    def invalidate(
+        self, predicate: t.Optional[t.Callable[[t.Any], bool]] = None
+    ) -> int:
+        if predicate is None:
+            count = len(self._data)
+            self.clear()
+            return count
+        keys = [key for key in self._data if predicate(key)]
+        for key in keys:
+            self._remove(key)
+        return len(keys)
+
+    def stats(self) -> t.Dict[str, int]:
+        return {
+            "entries": len(self._data),
+            "size": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+    # ----------------------------------------------------------------------- #
+    # mapping methods
+
+    def get(self, key: t.Any, default: t.Any = None) -> t.Any:
+        try:
+            value, expires_at, _ = self._data[key]
+        except KeyError:
+            return default
+        if expires_at is not None and expires_at <= monotonic():
+            self._remove(key)
+            self.expirations += 1
+            return default
+        return value
+
+    def __getitem__(self, key: t.Any) -> t.Any:
+        value = self.get(key, MISSING)
+        if value is MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: t.Any, value: t.Any):
+        self.set(key, value)
+
+    def __delitem__(self, key: t.Any):
+        self._remove(key)
+
+    def __contains__(self, key: t.Any) -> bool:
+        return self.get(key, MISSING) is not MISSING
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __iter__(self):
+        return iter(list(self._data))
+
+    def values(self):
+        now = monotonic()
+        return [
+            value
+            for value, expires_at, _ in self._data.values()
+            if expires_at is None or expires_at > now
+        ]
+
+    def clear(self):
+        self._data.clear()
+        self.size = 0
+
+    # ----------------------------------------------------------------------- #
+    # "internal" methods
+
+    def _remove(self, key: t.Any):
+        _, _, size = self._data.pop(key)
+        self.size -= size
+
+    def _evict(self):
+        while self._data and (
+            (self.max_entries is not None and len(self) > self.max_entries)
+            or (self.max_bytes is not None and self.size > self.max_bytes)
+        ):
+            _, (_, _, size) = self._data.popitem(last=False)
+            self.size -= size
+            self.evictions += 1
+
+    def __repr__(self):
+        return "<MemoryStore entries: {}, size: {}, ttl: {}>".format(
+            len(self._data), self.size, self.ttl
+        )
+
+
+__all__ = ("MemoryStore", "deep_sizeof")
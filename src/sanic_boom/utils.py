@@ -1,7 +1,11 @@
 import inspect
+import typing as t
 import uuid
 
+from sanic_boom.converters import to_bool
+
 REQUEST_CACHE_KEY = "_sanic_boom_cache_{!s}".format(uuid.uuid4())
+COMPONENT_TRACE_KEY = "_sanic_boom_trace_{!s}".format(uuid.uuid4())
 
 
 def param_parser(value: str, param: inspect.Parameter):
@@ -13,3 +17,9 @@ def param_parser(value: str, param: inspect.Parameter):
     elif annotation == bool:
         return value.lower() in ("true", "yes", "ok")
     return value
+
+
+def is_set(value: t.Any) -> bool:
+    """Whether a flag setting is on; settings may come from the environment,
+    as strings."""
+    return to_bool(value) if isinstance(value, str) else bool(value)
@@ -12,6 +12,8 @@ class Route:
         self.handler = handler
         self.methods = methods
         self.uri = uri
+        self.template = URLTemplate(uri)
+        self.params = self.template.params
 
     def __repr__(self):
         return "<Route name: {}, methods: {}, uri: {}>".format(
@@ -19,6 +21,51 @@ class Route:
         )
 
 
+class URLTemplate:
+    """The URI of a route compiled for building URLs: the literal parts of
+    the URI interleaved with its parameters, so expanding it is just a
+    matter of joining strings."""
+
+    __slots__ = ("uri", "literals", "params")
+
+    def __init__(self, uri: str):
+        literals = []
+        params = []
+        literal = ""
+
+        for i, segment in enumerate(uri.split("/")):
+            if i:
+                literal += "/"
+            if segment[:1] in (":", "*"):
+                literals.append(literal)
+                params.append(segment[1:])
+                literal = ""
+            else:
+                literal += segment
+
+        literals.append(literal)
+        self.uri = uri
+        self.literals = tuple(literals)
+        self.params = tuple(params)
+
+    def expand(self, values: dict) -> str:
+        """Fills the parameters of the URI with the given values (converted
+        to ``str``), raising ``KeyError`` if any of them is missing."""
+        if not self.params:
+            return self.uri
+        literals = self.literals
+        path = [literals[0]]
+        for i, name in enumerate(self.params, 1):
+            path.append(str(values[name]))
+            path.append(literals[i])
+        return "".join(path)
+
+    def __repr__(self):
+        return "<URLTemplate uri: {}, params: {}>".format(
+            self.uri, self.params
+        )
+
+
 class Middleware:
     def __init__(self, handler: object, attach_to: MiddlewareType):
         self.handler = handler
@@ -26,3 +73,44 @@ class Middleware:
 
     def __repr__(self):
         return "<Middleware for: {}>".format(str(self.attach_to))
+
+
+class RouteChain:
+    """Everything a matched route needs to be handled, computed once per route
+    and method: the handler and the middleware chains, already split by
+    :class:`MiddlewareType`. The global request middlewares are merged in
+    front of the layered ones, while the global response middlewares are
+    kept apart: a response returned by one of them only ends the global
+    chain, the layered one still runs afterwards (unless the request never
+    got past the global request middlewares)."""
+
+    __slots__ = (
+        "handler",
+        "uri",
+        "request_middlewares",
+        "global_response_middlewares",
+        "response_middlewares",
+    )
+
+    def __init__(
+        self,
+        handler: object,
+        uri: str,
+        request_middlewares: tuple,
+        global_response_middlewares: tuple,
+        response_middlewares: tuple,
+    ):
+        self.handler = handler
+        self.uri = uri
+        self.request_middlewares = request_middlewares
+        self.global_response_middlewares = global_response_middlewares
+        # the layered ones only
+        self.response_middlewares = response_middlewares
+
+    def __repr__(self):
+        return "<RouteChain uri: {}, request: {}, response: {}>".format(
+            self.uri,
+            len(self.request_middlewares),
+            len(self.global_response_middlewares)
+            + len(self.response_middlewares),
+        )
@@ -149,3 +149,60 @@ def test_cached_component(app):
     request, response = app.test_client.get("/uuid")
     assert response.status == 200
     assert request[response.text] == 2
+
+
+class Settings:
+    pass
+
+
+class SettingsComponent(Component):
+    calls = []
+
+    def resolve(self, param: inspect.Parameter) -> bool:
+        return param.annotation == Settings
+
+    async def get(self, request, param: inspect.Parameter) -> object:
+        SettingsComponent.calls.append(request.uri_template)
+        if request.uri_template == "/broken":
+            raise RuntimeError("broken settings")
+        return {"uri": request.uri_template}
+
+    def get_cache_lifecycle(self):
+        return ComponentCache.ENDPOINT
+
+    def is_eager(self):
+        return True
+
+
+def test_warm_up(app):
+    SettingsComponent.calls = []
+    app.add_component(SettingsComponent)
+    app.add_component(RequestIdentifierComponent)
+
+    @app.get("/foo/:name")
+    async def foo_handler(name, settings: Settings, rid: RequestIdentifier):
+        return text(settings["uri"])
+
+    @app.middleware(uri="/foo")
+    async def middleware(settings: Settings):  # noqa
+        pass
+
+    @app.get("/broken")
+    async def broken_handler(settings: Settings):
+        return text("OK")
+
+    request, response = app.test_client.get("/foo/bar")
+
+    assert response.status == 200
+    assert response.text == "/foo/:name"
+    # evaluated for the handler, the middleware and the broken handler, but
+    # not once more by the request itself
+    assert sorted(SettingsComponent.calls) == [
+        "/broken",
+        "/foo/:name",
+        "/foo/:name",
+    ]
+
+    # errors on warm up are not fatal, it is evaluated again on demand
+    request, response = app.test_client.get("/broken")
+    assert response.status == 500
@@ -1,6 +1,8 @@
 import asyncio
+import gc
 import inspect
 import logging
+import weakref
 from io import StringIO
 
 import pytest
@@ -8,6 +10,8 @@ from sanic.exceptions import ServiceUnavailable
 from sanic.response import text
 
 from sanic_boom import BoomRequest, BoomRouter, Component, SanicBoom
+from sanic_boom.exceptions import RouterFrozen, UnresolvedParameters
+from sanic_boom.instrumentation import Histogram, MemorySink
 
 
 class FakeComponent(Component):  # noqa this is a very simple example
@@ -285,3 +289,221 @@ def test_response_no_gather(app):
     response = app.test_client.get("/foo", gather_request=False)
     assert response.status == 200
     assert response.text == "OK from handler"
+
+
+def test_finalize(app):
+    app.add_component(FakeComponent)
+
+    @app.middleware(uri="/foo", attach_to="response")
+    async def response_middleware(request, response):  # noqa
+        pass
+
+    @app.get("/foo/:identifier")
+    async def handler(request, identifier: int):
+        return text("OK")
+
+    report = app.finalize()
+    assert report == {"routes": 1, "chains": 1, "plans": 3, "components": 1}
+    assert app.router.frozen is True
+
+    # it should be safe to finalize the application more than once
+    assert app.finalize() == report
+
+    with pytest.raises(RouterFrozen):
+
+        @app.get("/bar")
+        async def another_handler(request):  # noqa
+            pass
+
+    with pytest.raises(RouterFrozen):
+
+        @app.middleware(uri="/foo")
+        async def request_middleware(request):  # noqa
+            pass
+
+    with pytest.raises(RouterFrozen):
+
+        @app.middleware
+        async def global_middleware(request):  # noqa
+            pass
+
+    request, response = app.test_client.get("/foo/42")
+    assert response.status == 200
+    assert response.text == "OK"
+
+
+def test_finalize_unresolved_parameters(app):
+    @app.middleware(uri="/foo")
+    async def request_middleware(request, user):  # noqa
+        pass
+
+    @app.get("/foo/:identifier")
+    async def handler(request, identifier: int, session):  # noqa
+        pass
+
+    with pytest.raises(UnresolvedParameters) as exc_info:
+        app.finalize()
+
+    assert sorted(name for _, name in exc_info.value.unresolved) == [
+        "session",
+        "user",
+    ]
+    assert app.router.frozen is False
+
+
+def test_instrumentation(app):
+    class Tracker:
+        pass
+
+    class TrackerComponent(Component):
+        def resolve(self, param: inspect.Parameter) -> bool:
+            return param.annotation is Tracker
+
+        async def get(self, request):
+            return "tracked"
+
+    app.add_component(TrackerComponent)
+    sink = app.instrument()
+    assert isinstance(sink, MemorySink)
+    assert app.cache_engine.sink is sink
+
+    @app.middleware
+    async def global_middleware(request):  # noqa
+        pass
+
+    @app.middleware(uri="/hello")
+    async def layered_middleware(request):  # noqa
+        pass
+
+    @app.middleware(attach_to="response")
+    async def response_middleware(request, response):  # noqa
+        pass
+
+    @app.get("/hello")
+    async def handler(request, tracker: Tracker):
+        return text(tracker)
+
+    request, response = app.test_client.get("/hello")
+    assert response.text == "tracked"
+    # a prebuilt response, the error handler is not called
+    request, response = app.test_client.get("/not-found")
+    assert response.status == 404
+
+    counts = {key: h.count for key, h in sink.histograms.items()}
+    assert counts == {
+        ("router", None): 2,
+        ("global_request_middleware", None): 2,
+        ("layered_request_middleware", None): 1,
+        ("component", "TrackerComponent"): 1,
+        ("resolve", None): 1,
+        ("handler", None): 1,
+        ("response_middleware", None): 2,
+        ("total", None): 2,
+    }
+
+    exported = sink.export_prometheus()
+    assert "# TYPE sanic_boom_stage_duration_seconds histogram" in exported
+    assert (
+        'sanic_boom_stage_duration_seconds_bucket{stage="component",'
+        'name="TrackerComponent",le="+Inf"} 1'
+    ) in exported
+    assert 'sanic_boom_stage_duration_seconds_count{stage="total"} 2' in (
+        exported
+    )
+
+    assert app.instrument(False) is None
+    sink.clear()
+    request, response = app.test_client.get("/hello")
+    assert response.status == 200
+    assert sink.histograms == {}
+
+
+def test_histogram():
+    histogram = Histogram(buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(value)
+    assert histogram.count == 4
+    assert histogram.sum == pytest.approx(2.65)
+    assert histogram.cumulative() == [(0.1, 2), (1.0, 3), (float("inf"), 4)]
+
+
+def test_cache_info(app):
+    app.config.BOOM_ROUTER_CACHE_SIZE = 1
+    app.config.BOOM_RESOLVER_CACHE_SIZE = 2
+
+    @app.get("/hello/:name")
+    async def handler(request, name):
+        return text(name)
+
+    for name in ("foo", "bar", "foo"):
+        request, response = app.test_client.get("/hello/" + name)
+        assert response.text == name
+
+    info = app.cache_info()
+    assert info["router"]["dynamic"]["entries"] == 1
+    assert info["router"]["dynamic"]["misses"] == 3
+    # the test client adds a middleware of its own on every request
+    assert info["resolver"]["plans"] >= 1
+    assert info["resolver"]["matches"]["entries"] == 1  # just "name"
+
+    app.clear_caches()
+    info = app.cache_info()
+    assert info["router"]["dynamic"]["entries"] == 0
+    assert info["resolver"] == {
+        "plans": 0,
+        "matches": dict(info["resolver"]["matches"], entries=0, size=0),
+    }
+
+
+def test_caches_do_not_keep_apps_alive():
+    app = SanicBoom("test_caches_do_not_keep_apps_alive")
+
+    @app.get("/hello/:name")
+    async def handler(request, name):  # noqa
+        pass
+
+    app.finalize()
+    app.router.get(
+        BoomRequest(
+            url_bytes=b"/hello/world",
+            headers={},
+            version="1.1",
+            method="GET",
+            transport=None,
+        )
+    )
+    ref = weakref.ref(app)
+    del app
+    gc.collect()
+    assert ref() is None
+
+
+@pytest.mark.skipif(not hasattr(gc, "freeze"), reason="requires gc.freeze")
+def test_preload(app):
+    @app.get("/hello/:name")
+    async def handler(request, name):
+        return text(name)
+
+    app.config.BOOM_PRELOAD = True
+    try:
+        request, response = app.test_client.get("/hello/world")
+        assert gc.get_freeze_count() > 0
+    finally:
+        gc.unfreeze()
+
+    assert response.text == "world"
+    assert app.router.frozen is True
+
+
+def test_preload_from_the_environment(app, monkeypatch):
+    preloaded = []
+    monkeypatch.setattr(app, "preload", lambda: preloaded.append(True))
+
+    @app.get("/")
+    async def handler(request):
+        return text("OK")
+
+    app.config.BOOM_PRELOAD = "false"
+    request, response = app.test_client.get("/")
+    assert response.text == "OK"
+    assert preloaded == []
@@ -9,6 +9,9 @@ from sanic.request import Request
 from sanic.response import text
 
 from sanic_boom import Component, ComponentCache
+from sanic_boom.request import ComponentValues
+from sanic_boom.shared_store import SharedMemoryStore
+from sanic_boom.store import MemoryStore
 from sanic_boom.utils import REQUEST_CACHE_KEY
 
 
@@ -28,6 +31,10 @@ class ThreadCached:
     pass
 
 
+class WorkerCached:
+    pass
+
+
 class AppCached:
     pass
 
@@ -64,6 +71,14 @@ class ThreadCachedComponent(NonCachedComponent):
         return ComponentCache.CURRENT_THREAD
 
 
+class WorkerCachedComponent(NonCachedComponent):
+    def resolve(self, param: inspect.Parameter) -> bool:
+        return param.annotation == WorkerCached
+
+    def get_cache_lifecycle(self) -> ComponentCache:
+        return ComponentCache.WORKER
+
+
 class AppCachedComponent(NonCachedComponent):
     def resolve(self, param: inspect.Parameter) -> bool:
         return param.annotation == AppCached
@@ -72,6 +87,15 @@ class AppCachedComponent(NonCachedComponent):
         return ComponentCache.APP
 
 
+def cached_endpoints(cache_engine):
+    return set(endpoint for endpoint, _ in cache_engine.endpoint_cache)
+
+
+def cached_values(cache_engine, endpoint):
+    store = cache_engine.endpoint_cache
+    return [store[key] for key in store if key[0] == endpoint]
+
+
 # --------------------------------------------------------------------------- #
 # actual testing
 # --------------------------------------------------------------------------- #
@@ -104,17 +128,17 @@ async def test_request_cached_component(some_app, sanic_request):
     ret = await hello(**kw)
 
     assert type(ret) is str
-    assert type(sanic_request[REQUEST_CACHE_KEY]) is dict
-    assert len(sanic_request[REQUEST_CACHE_KEY]) == 1
-    assert ret in sanic_request[REQUEST_CACHE_KEY].values()
+    assert type(sanic_request.component_values) is ComponentValues
+    assert len(sanic_request.components) == 1
+    assert ret in sanic_request.components.values()
 
     # same request, result should be cached for "my_var"
     kw2 = await some_app.resolver.resolve(request=sanic_request, func=hello)
     ret2 = await hello(**kw2)
 
     assert type(ret2) is str
-    assert len(sanic_request[REQUEST_CACHE_KEY]) == 1
-    assert ret2 in sanic_request[REQUEST_CACHE_KEY].values()
+    assert len(sanic_request.components) == 1
+    assert ret2 in sanic_request.components.values()
     # both my_vars should be equal
     assert ret == ret2
 
@@ -157,18 +181,18 @@ async def test_endpoint_cached_component(some_app, sanic_request):
 
     assert type(ret[0]) is str
     assert type(ret[1]) is str
-    assert len(some_app.cache_engine._endpoints) == 1
-    assert len(some_app.cache_engine._endpoints[hello].values()) == 2
-    assert ret[0] in some_app.cache_engine._endpoints[hello].values()
-    assert ret[1] in some_app.cache_engine._endpoints[hello].values()
+    assert len(cached_endpoints(some_app.cache_engine)) == 1
+    assert len(cached_values(some_app.cache_engine, hello)) == 2
+    assert ret[0] in cached_values(some_app.cache_engine, hello)
+    assert ret[1] in cached_values(some_app.cache_engine, hello)
 
     # same endpoint, result should be cached for "my_var" and "another_var"
     kw2 = await some_app.resolver.resolve(request=sanic_request, func=hello)
     ret2 = await hello(**kw2)
 
-    assert len(some_app.cache_engine._endpoints) == 1
-    assert ret2[0] in some_app.cache_engine._endpoints[hello].values()
-    assert ret2[1] in some_app.cache_engine._endpoints[hello].values()
+    assert len(cached_endpoints(some_app.cache_engine)) == 1
+    assert ret2[0] in cached_values(some_app.cache_engine, hello)
+    assert ret2[1] in cached_values(some_app.cache_engine, hello)
     # both my_var and another_var should be equal
     assert ret == ret2
 
@@ -187,9 +211,9 @@ async def test_endpoint_cached_component(some_app, sanic_request):
     # since the cache is bound to the endpoint, the result should be the same
     assert type(ret3[0]) is str
     assert type(ret3[1]) is str
-    assert len(some_app.cache_engine._endpoints) == 1
-    assert ret3[0] in some_app.cache_engine._endpoints[hello].values()
-    assert ret3[1] in some_app.cache_engine._endpoints[hello].values()
+    assert len(cached_endpoints(some_app.cache_engine)) == 1
+    assert ret3[0] in cached_values(some_app.cache_engine, hello)
+    assert ret3[1] in cached_values(some_app.cache_engine, hello)
     assert ret == ret2
     assert ret == ret3
 
@@ -198,13 +222,46 @@ async def test_endpoint_cached_component(some_app, sanic_request):
     ret4 = await world(**kw4)
 
     assert type(ret4) is str
-    assert len(some_app.cache_engine._endpoints) == 2
-    assert ret4 not in some_app.cache_engine._endpoints[hello].values()
-    assert ret4 in some_app.cache_engine._endpoints[world].values()
+    assert len(cached_endpoints(some_app.cache_engine)) == 2
+    assert ret4 not in cached_values(some_app.cache_engine, hello)
+    assert ret4 in cached_values(some_app.cache_engine, world)
     assert ret[0] != ret4
     assert ret[1] != ret4
 
 
+@pytest.mark.asyncio
+async def test_endpoint_cache_bounds(some_app, sanic_request):
+    async def hello(my_var: EndpointCached, another_var: EndpointCached):
+        return my_var, another_var
+
+    async def world(my_var: EndpointCached):
+        return my_var
+
+    some_app.add_component(EndpointCachedComponent)
+    store = some_app.cache_engine.endpoint_cache
+    store.max_entries = 2
+    # sizes are only measured with a budget
+    store.max_bytes = 1024 * 1024
+
+    kw = await some_app.resolver.resolve(request=sanic_request, func=hello)
+    await hello(**kw)
+
+    assert len(store) == 2
+    assert store.size > 0
+
+    kw = await some_app.resolver.resolve(request=sanic_request, func=world)
+    await world(**kw)
+
+    # the least recently used value of "hello" was evicted
+    assert len(store) == 2
+    assert len(cached_values(some_app.cache_engine, hello)) == 1
+    assert store.stats()["evictions"] == 1
+
+    assert some_app.cache_engine.flush_endpoint(world) == 1
+    assert cached_values(some_app.cache_engine, world) == []
+    assert len(store) == 1
+
+
 @pytest.mark.asyncio
 async def test_thread_cached_component_simple(some_app, sanic_request):
     async def hello(my_var: ThreadCached):
@@ -274,29 +331,185 @@ async def test_thread_cached_component_multiple(some_app, sanic_request):
     assert len(set(my_vars)) == unique_values
 
 
+@pytest.mark.asyncio
+async def test_worker_cached_component(some_app, sanic_request):
+    async def hello(my_var: WorkerCached):
+        return my_var
+
+    async def world(my_var: WorkerCached, baz: WorkerCached):
+        return my_var, baz
+
+    some_app.add_component(WorkerCachedComponent)
+    some_app.cache_engine.start_worker(asyncio.get_event_loop())
+
+    kw = await some_app.resolver.resolve(request=sanic_request, func=hello)
+    ret = await hello(**kw)
+
+    new_request = Request(
+        url_bytes=b"/foo/baz",
+        headers={},
+        version=None,
+        method="POST",
+        transport=None,
+    )
+    kw = await some_app.resolver.resolve(request=new_request, func=world)
+    ret2 = await world(**kw)
+
+    # same parameter, same value, even for another request and endpoint
+    assert ret == ret2[0]
+    assert ret != ret2[1]
+    assert len(some_app.cache_engine.worker_cache) == 2
+
+    some_app.cache_engine.stop_worker()
+
+    assert some_app.cache_engine.worker_cache == {}
+    assert some_app.cache_engine.worker_loop is None
+
+    kw = await some_app.resolver.resolve(request=sanic_request, func=hello)
+    ret3 = await hello(**kw)
+
+    assert ret != ret3
+
+
+def test_worker_cache_scope(app):
+    app.add_component(WorkerCachedComponent)
+
+    @app.get("/")
+    async def handler(my_var: WorkerCached):
+        return text(my_var)
+
+    request, response = app.test_client.get("/")
+    assert app.cache_engine.worker_cache == {}
+
+    # a new worker, a new value
+    request, response2 = app.test_client.get("/")
+    assert response.text != response2.text
+
+
+def test_thread_cache_per_app(some_app):
+    another_app = some_app.__class__()
+
+    assert (
+        some_app.cache_engine._thread_local
+        is not another_app.cache_engine._thread_local
+    )
+
+
 @pytest.mark.asyncio
 async def test_app_cached_component(some_app, sanic_request):
     async def hello(my_var: AppCached):
         return my_var
 
+    async def world(baz: AppCached):
+        return baz
+
     some_app.add_component(AppCachedComponent)
 
-    ret = None
-    ret2 = None
+    kw = await some_app.resolver.resolve(request=sanic_request, func=hello)
+    ret = await hello(**kw)
+
+    assert type(ret) is str
+
+    # another request, still the same value for the same parameter
+    new_request = Request(
+        url_bytes=b"/foo/baz",
+        headers={},
+        version=None,
+        method="POST",
+        transport=None,
+    )
+    kw = await some_app.resolver.resolve(request=new_request, func=hello)
+    ret2 = await hello(**kw)
+
+    assert ret == ret2
+    assert some_app.cache_engine.app_cache.stats()["hits"] == 1
+    assert some_app.cache_engine.app_cache.stats()["misses"] == 1
+
+    kw = await some_app.resolver.resolve(request=sanic_request, func=world)
+    ret3 = await world(**kw)
+
+    assert ret != ret3
+
+    # invalidating by parameter
+    param = inspect.signature(hello).parameters["my_var"]
+    assert some_app.cache_engine.invalidate(param=param) == 1
+
+    kw = await some_app.resolver.resolve(request=sanic_request, func=hello)
+    ret4 = await hello(**kw)
+    kw = await some_app.resolver.resolve(request=sanic_request, func=world)
+    ret5 = await world(**kw)
+
+    assert ret4 != ret
+    assert ret5 == ret3
+
+    # invalidating by component class
+    assert some_app.cache_engine.invalidate(AppCachedComponent) == 2
+    assert len(some_app.cache_engine.app_cache) == 0
+
+
+def test_app_cache_settings(app):
+    app.add_component(AppCachedComponent)
+    app.config.BOOM_APP_CACHE_MAX_ENTRIES = 1
+    app.config.BOOM_APP_CACHE_TTL = 60
+
+    @app.get("/")
+    async def handler(first: AppCached, second: AppCached):
+        return text("OK")
+
+    request, response = app.test_client.get("/")
+    assert response.status == 200
+
+    app_cache = app.cache_engine.app_cache
+    assert app_cache.ttl == 60
+    assert len(app_cache) == 1
+    assert app_cache.stats()["evictions"] == 1
+
+
+def test_endpoint_cache_settings(app):
+    app.add_component(EndpointCachedComponent)
+    app.config.BOOM_ENDPOINT_CACHE_MAX_ENTRIES = 1
+    app.config.BOOM_ENDPOINT_CACHE_MAX_BYTES = 1024 * 1024
+    app.config.BOOM_ENDPOINT_CACHE_TTL = 60
+
+    @app.get("/")
+    async def handler(first: EndpointCached, second: EndpointCached):
+        return text("OK")
+
+    request, response = app.test_client.get("/")
+    assert response.status == 200
+
+    endpoint_cache = app.cache_engine.endpoint_cache
+    assert endpoint_cache.ttl == 60
+    assert endpoint_cache.max_bytes == 1024 * 1024
+    assert len(endpoint_cache) == 1
+    assert endpoint_cache.stats()["evictions"] == 1
 
-    with pytest.warns(RuntimeWarning):
-        kw = await some_app.resolver.resolve(request=sanic_request, func=hello)
-        ret = await hello(**kw)
 
-        assert type(ret) is str
+@pytest.mark.asyncio
+async def test_app_cached_component_ttl(some_app, sanic_request):
+    class ShortLivedComponent(AppCachedComponent):
+        def get_cache_ttl(self):
+            return 0.05
+
+    async def hello(my_var: AppCached):
+        return my_var
+
+    some_app.add_component(ShortLivedComponent)
+
+    kw = await some_app.resolver.resolve(request=sanic_request, func=hello)
+    ret = await hello(**kw)
+    kw = await some_app.resolver.resolve(request=sanic_request, func=hello)
+    ret2 = await hello(**kw)
+
+    assert ret == ret2
 
-    with pytest.warns(RuntimeWarning):
-        kw = await some_app.resolver.resolve(request=sanic_request, func=hello)
-        ret2 = await hello(**kw)
+    await asyncio.sleep(0.1)
 
-        assert type(ret2) is str
+    kw = await some_app.resolver.resolve(request=sanic_request, func=hello)
+    ret3 = await hello(**kw)
 
-    assert ret != ret2
+    assert ret != ret3
+    assert some_app.cache_engine.app_cache.stats()["expirations"] == 1
 
 
 def test_boom_request_components(app):
@@ -310,17 +523,257 @@ def test_boom_request_components(app):
     async def test_handler():
         return text("test")
 
+    leftovers = []
+
+    @app.middleware(attach_to="response")
+    async def close_leftovers(request, response):
+        leftovers.append(request.components)
+
     request, response = app.test_client.get("/")
 
     assert response.status == 200
     assert response.text == "OK"
 
-    assert type(request.components) is dict
-    assert len(request.components) == 2
+    assert type(leftovers[-1]) is dict
+    assert len(leftovers[-1]) == 2
+    # released once the response is written
+    assert request.components is None
 
     request, response = app.test_client.get("/test")
 
     assert response.status == 200
     assert response.text == "test"
 
-    assert request.components is None
+    assert leftovers[-1] is None
+
+
+class SlowCached:
+    pass
+
+
+class SlowCachedComponent(Component):
+    lifecycle = ComponentCache.ENDPOINT
+    calls = 0
+
+    def resolve(self, param: inspect.Parameter) -> bool:
+        return param.annotation == SlowCached
+
+    async def get(self, request: Request, param: inspect.Parameter) -> object:
+        SlowCachedComponent.calls += 1
+        await asyncio.sleep(0.05)
+        if request.path == "/error":
+            raise RuntimeError("something went wrong")
+        return str(uuid.uuid4())
+
+    def get_cache_lifecycle(self) -> ComponentCache:
+        return self.lifecycle
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "lifecycle", [ComponentCache.REQUEST, ComponentCache.ENDPOINT]
+)
+async def test_single_flight(some_app, sanic_request, lifecycle):
+    async def hello(my_var: SlowCached):
+        return my_var
+
+    SlowCachedComponent.calls = 0
+    SlowCachedComponent.lifecycle = lifecycle
+    some_app.add_component(SlowCachedComponent)
+
+    rets = await asyncio.gather(
+        *[
+            some_app.resolver.resolve(request=sanic_request, func=hello)
+            for _ in range(10)
+        ]
+    )
+
+    assert SlowCachedComponent.calls == 1
+    assert len(set(ret["my_var"] for ret in rets)) == 1
+
+
+@pytest.mark.asyncio
+async def test_single_flight_error(some_app):
+    async def hello(my_var: SlowCached):
+        return my_var
+
+    SlowCachedComponent.calls = 0
+    SlowCachedComponent.lifecycle = ComponentCache.ENDPOINT
+    some_app.add_component(SlowCachedComponent)
+    request = Request(
+        url_bytes=b"/error",
+        headers={},
+        version=None,
+        method="GET",
+        transport=None,
+    )
+
+    rets = await asyncio.gather(
+        *[
+            some_app.resolver.resolve(request=request, func=hello)
+            for _ in range(5)
+        ],
+        return_exceptions=True
+    )
+
+    assert SlowCachedComponent.calls == 1
+    assert all(isinstance(ret, RuntimeError) for ret in rets)
+    # errors are never cached
+    assert cached_values(some_app.cache_engine, hello) == []
+
+
+@pytest.mark.asyncio
+async def test_cached_none(some_app, sanic_request):
+    calls = []
+
+    class NoneComponent(RequestCachedComponent):
+        async def get(self, request, param: inspect.Parameter):
+            calls.append(param.name)
+            return None
+
+    async def hello(first: RequestCached, second: RequestCached):
+        return first, second
+
+    some_app.add_component(NoneComponent)
+
+    kw = await some_app.resolver.resolve(request=sanic_request, func=hello)
+    assert await hello(**kw) == (None, None)
+    kw = await some_app.resolver.resolve(request=sanic_request, func=hello)
+    assert await hello(**kw) == (None, None)
+
+    # once per parameter, not once per lookup
+    assert calls == ["first", "second"]
+
+
+@pytest.mark.asyncio
+async def test_single_flight_cancelled(some_app, sanic_request):
+    async def hello(my_var: SlowCached):
+        return my_var
+
+    SlowCachedComponent.calls = 0
+    SlowCachedComponent.lifecycle = ComponentCache.ENDPOINT
+    some_app.add_component(SlowCachedComponent)
+
+    first = asyncio.ensure_future(
+        some_app.resolver.resolve(request=sanic_request, func=hello)
+    )
+    await asyncio.sleep(0.01)
+    second = asyncio.ensure_future(
+        some_app.resolver.resolve(request=sanic_request, func=hello)
+    )
+    await asyncio.sleep(0.01)
+    first.cancel()
+
+    # the waiter computes the value itself instead of being cancelled too
+    ret = await second
+    assert first.cancelled()
+    assert type(ret["my_var"]) is str
+    assert SlowCachedComponent.calls == 2
+    assert cached_values(some_app.cache_engine, hello) == [ret["my_var"]]
+
+
+def test_component_tracing(app):
+    app.add_component(RequestCachedComponent)
+    app.add_component(EndpointCachedComponent)
+    app.add_component(SlowCachedComponent)
+    app.cache_engine.tracing = True
+    SlowCachedComponent.lifecycle = ComponentCache.NO_CACHE
+
+    @app.middleware(uri="/")
+    async def middleware(request, var1: RequestCached):  # noqa
+        pass
+
+    @app.get("/")
+    async def handler(var1: RequestCached, var2: EndpointCached):
+        return text("OK")
+
+    @app.get("/error")
+    async def error_handler(my_var: SlowCached):
+        return text("OK")  # noqa
+
+    for _ in range(2):
+        request, response = app.test_client.get("/")
+        assert response.status == 200
+
+    trace = [
+        (entry.component.__class__.__name__, entry.param.name, entry.cached)
+        for entry in request.component_trace
+    ]
+    assert trace == [
+        ("RequestCachedComponent", "var1", False),
+        ("RequestCachedComponent", "var1", True),
+        ("EndpointCachedComponent", "var2", True),
+    ]
+
+    request, response = app.test_client.get("/error")
+    assert response.status == 500
+    assert request.component_trace[-1].error is True
+
+    stats = app.cache_engine.stats()
+    # the middleware runs for "/error" as well
+    assert stats["RequestCachedComponent"] == {
+        "lifecycle": "REQUEST",
+        "hits": 2,
+        "misses": 3,
+        "errors": 0,
+        "time": pytest.approx(stats["RequestCachedComponent"]["time"]),
+    }
+    assert stats["EndpointCachedComponent"]["hits"] == 1
+    assert stats["EndpointCachedComponent"]["misses"] == 1
+    assert stats["SlowCachedComponent"]["misses"] == 1
+    assert stats["SlowCachedComponent"]["errors"] == 1
+
+    app.cache_engine.tracing = False
+    request, response = app.test_client.get("/")
+    assert request.component_trace is None
+
+
+@pytest.mark.asyncio
+async def test_shared_app_cache(some_app, sanic_request):
+    async def hello(my_var: AppCached):
+        return my_var
+
+    some_app.add_component(AppCachedComponent)
+    store = some_app.cache_engine.share_app_cache(size=4096)
+
+    kw = await some_app.resolver.resolve(request=sanic_request, func=hello)
+    ret = await hello(**kw)
+
+    # computed by another worker, with its own instance of the component
+    another_app = some_app.__class__()
+    another_app.add_component(AppCachedComponent)
+    another_app.cache_engine.app_cache = store
+
+    kw = await another_app.resolver.resolve(request=sanic_request, func=hello)
+
+    assert await hello(**kw) == ret
+    assert store.stats()["hits"] == 1
+    assert some_app.cache_engine.invalidate(AppCachedComponent) == 1
+    assert len(store) == 0
+
+
+def test_shared_app_cache_settings(app):
+    app.add_component(AppCachedComponent)
+
+    @app.get("/")
+    async def handler(value: AppCached):
+        return text(value)
+
+    # settings may come from the environment, as strings
+    app.config.BOOM_APP_CACHE_SHARED = "False"
+    request, response = app.test_client.get("/")
+    assert response.status == 200
+    assert isinstance(app.cache_engine.app_cache, MemoryStore)
+
+    app.config.BOOM_APP_CACHE_SHARED = "true"
+    app.config.BOOM_APP_CACHE_SHARED_SIZE = 4096
+    request, response = app.test_client.get("/")
+    assert response.status == 200
+    store = app.cache_engine.app_cache
+    assert isinstance(store, SharedMemoryStore)
+    assert store.data_size == 4096
+
+    # the store is created once, before the workers are forked
+    request, response = app.test_client.get("/")
+    assert app.cache_engine.app_cache is store
+    assert len(store) == 1
@@ -1,12 +1,16 @@
+import asyncio
 import inspect
 import json
 import sys
+import time
 import typing as t
 import uuid
 
+import pytest
 from sanic.response import text
 
 from sanic_boom import Component, ComponentCache
+from sanic_boom.exceptions import CircularDependency, UnresolvedParameters
 
 try:  # noqa
     from ujson import loads as json_loads
@@ -96,3 +100,195 @@ def test_handler_component(app):
     )
     assert response.status == 200
     assert response.text == "working"
+
+
+class Slow:
+    pass
+
+
+class SlowComponent(Component):
+    def resolve(self, param) -> bool:
+        return param.annotation == Slow
+
+    async def get(self, param: inspect.Parameter):
+        await asyncio.sleep(0.2)
+        return param.name
+
+
+def test_dependency_branches(app):
+    app.add_component(BodyComponent)
+    app.add_component(TrackerComponent)
+    app.add_component(ParserComponent)
+    app.add_component(SlowComponent)
+
+    async def handler(
+        parser: Parser[JsonParser], track_id, first: Slow, second: Slow
+    ):  # noqa
+        pass
+
+    plan = app.resolver.get_plan(handler)
+
+    # "parser" and "track_id" share the same request cached "track_id"
+    assert [[s.name for s in branch] for branch in plan.branches] == [
+        ["parser", "track_id"],
+        ["first"],
+        ["second"],
+    ]
+
+
+def test_concurrent_components(app):
+    app.add_component(BodyComponent)
+    app.add_component(TrackerComponent)
+    app.add_component(ParserComponent)
+    app.add_component(SlowComponent)
+
+    @app.post("/")
+    async def handler(
+        parser: Parser[JsonParser],
+        track_id,
+        first: Slow,
+        second: Slow,
+        third: Slow,
+    ):
+        assert parser.track_id == track_id
+        return text("{} {} {}".format(first, second, third))
+
+    started = time.monotonic()
+    request, response = app.test_client.post(
+        "/", data=json.dumps({"hello": "world"})
+    )
+    elapsed = time.monotonic() - started
+
+    assert response.status == 200
+    assert response.text == "first second third"
+    # sequentially, this would take at least 0.6 seconds
+    assert elapsed < 0.6
+
+
+class Cached:
+    pass
+
+
+class Failing:
+    pass
+
+
+class CachedComponent(Component):
+    def resolve(self, param) -> bool:
+        return param.annotation == Cached
+
+    async def get(self, param: inspect.Parameter):
+        await asyncio.sleep(0)
+        return param.name
+
+    def get_cache_lifecycle(self):
+        return ComponentCache.ENDPOINT
+
+
+class FailingComponent(Component):
+    def resolve(self, param) -> bool:
+        return param.annotation == Failing
+
+    async def get(self):
+        await asyncio.sleep(0.01)
+        raise ValueError("failed")
+
+
+@pytest.mark.asyncio
+async def test_cached_branches_run_inline(
+    some_app, sanic_request, monkeypatch
+):
+    some_app.add_component(CachedComponent)
+    ensure_future = asyncio.ensure_future
+    tasks = []
+
+    def counting_ensure_future(*args, **kwargs):
+        tasks.append(args)
+        return ensure_future(*args, **kwargs)
+
+    monkeypatch.setattr(asyncio, "ensure_future", counting_ensure_future)
+
+    async def handler(first: Cached, second: Cached):
+        pass
+
+    kw = await some_app.resolver.resolve(request=sanic_request, func=handler)
+    assert kw == {"first": "first", "second": "second"}
+    assert len(tasks) == 2  # both had to wait
+
+    kw = await some_app.resolver.resolve(request=sanic_request, func=handler)
+    assert kw == {"first": "first", "second": "second"}
+    assert len(tasks) == 2  # cache hits never do
+
+
+@pytest.mark.asyncio
+async def test_failing_branch_cancels_the_others(some_app, sanic_request):
+    finished = []
+
+    class SlowerComponent(SlowComponent):
+        async def get(self, param: inspect.Parameter):
+            await asyncio.sleep(0.05)
+            finished.append(param.name)
+            return param.name
+
+    some_app.add_component(SlowerComponent)
+    some_app.add_component(FailingComponent)
+
+    async def handler(first: Slow, failing: Failing, second: Slow):
+        pass
+
+    with pytest.raises(ValueError):
+        await some_app.resolver.resolve(request=sanic_request, func=handler)
+
+    await asyncio.sleep(0.1)
+    assert finished == []
+
+
+def test_circular_dependencies(app):
+    class Egg:
+        pass
+
+    class Chicken:
+        pass
+
+    class EggComponent(Component):
+        def resolve(self, param) -> bool:
+            return param.annotation is Egg
+
+        async def get(self, request, chicken: Chicken):
+            return Egg()
+
+    class ChickenComponent(Component):
+        def resolve(self, param) -> bool:
+            return param.annotation is Chicken
+
+        async def get(self, request, egg: Egg):
+            return Chicken()
+
+    app.add_component(EggComponent)
+    app.add_component(ChickenComponent)
+
+    @app.get("/")
+    async def handler(egg: Egg):
+        return text("OK")
+
+    with pytest.raises(UnresolvedParameters) as exc_info:
+        app.finalize()
+    assert isinstance(exc_info.value, CircularDependency)
+    assert "depends on the component itself" in str(exc_info.value)
+
+
+def test_self_dependency(app):
+    class Ouroboros:
+        pass
+
+    class OuroborosComponent(Component):
+        def resolve(self, param) -> bool:
+            return param.annotation is Ouroboros
+
+        async def get(self, request, tail: Ouroboros):
+            return Ouroboros()
+
+    app.add_component(OuroborosComponent)
+
+    with pytest.raises(CircularDependency):
+        app.finalize()
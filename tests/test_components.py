@@ -4,8 +4,9 @@ import typing as t
 import pytest
 from sanic.request import Request
 
-from sanic_boom import Component, Resolver
+from sanic_boom import Component, MatchKeys, Resolver
 from sanic_boom.exceptions import InvalidComponent, NoApplicationFound
+from sanic_boom.resolver import SlotKind
 
 
 class JSONBody(t.Generic[t.T_co]):
@@ -134,3 +135,94 @@ async def test_resolver_no_function(sanic_request):
 
     with pytest.raises(TypeError):
         await resolver.resolve(request=sanic_request, func={})
+
+
+# --------------------------------------------------------------------------- #
+# injection plans
+# --------------------------------------------------------------------------- #
+
+
+@pytest.mark.asyncio
+async def test_resolver_plan(some_app, sanic_request):
+    async def hello(request, input: JSONBody[str], age: int, *args, **kw):
+        pass
+
+    some_app.add_component(JSONBodyComponent)
+
+    plan = some_app.resolver.get_plan(hello)
+
+    assert [(s.name, s.kind) for s in plan.slots] == [
+        ("request", SlotKind.REQUEST),
+        ("input", SlotKind.COMPONENT),
+        ("age", SlotKind.UNRESOLVED),
+    ]
+    assert isinstance(plan.slots[1].component, JSONBodyComponent)
+    # compiled only once per callable
+    assert some_app.resolver.get_plan(hello) is plan
+
+    ret = await some_app.resolver.resolve(
+        request=sanic_request, func=hello, prefetched={"age": "42"}
+    )
+    assert ret.get("age") == 42
+
+    # the unresolved slot is only an error if nothing was prefetched for it
+    with pytest.raises(ValueError):
+        await some_app.resolver.resolve(request=sanic_request, func=hello)
+
+
+def test_resolver_plan_invalidation(some_app):
+    async def hello(input: JSONBody[str]):  # noqa
+        pass
+
+    plan = some_app.resolver.get_plan(hello)
+    assert plan.slots[0].kind == SlotKind.UNRESOLVED
+
+    some_app.add_component(JSONBodyComponent)
+
+    plan = some_app.resolver.get_plan(hello)
+    assert plan.slots[0].kind == SlotKind.COMPONENT
+
+
+def test_resolver_match_keys(some_app):
+    calls = []
+
+    class IndexedJSONBodyComponent(JSONBodyComponent):
+        def get_match_keys(self):
+            return MatchKeys(origins=(JSONBody,))
+
+        def resolve(self, param: inspect.Parameter) -> bool:
+            calls.append(param.name)
+            return super().resolve(param)
+
+    class PredicateComponent(FakeComponent):
+        def resolve(self, param: inspect.Parameter) -> bool:
+            calls.append(param.name)
+            return param.name in ("token", "user")
+
+    class UserComponent(FakeComponent):
+        def get_match_keys(self):
+            return MatchKeys(names=("user",), annotations=(int,))
+
+    some_app.add_component(IndexedJSONBodyComponent)
+    some_app.add_component(PredicateComponent)
+    some_app.add_component(UserComponent)
+    find = some_app.resolver.find_component
+
+    def param(name, annotation=inspect.Parameter.empty):
+        return inspect.Parameter(
+            name,
+            inspect.Parameter.POSITIONAL_OR_KEYWORD,
+            annotation=annotation,
+        )
+
+    found = find(param=param("body", JSONBody[str]))
+    assert isinstance(found, IndexedJSONBodyComponent)
+    # indexed components registered before any predicate are never scanned
+    assert calls == []
+
+    # the predicate component was registered before UserComponent
+    assert isinstance(find(param=param("user")), PredicateComponent)
+    assert isinstance(find(param=param("token")), PredicateComponent)
+    assert isinstance(find(param=param("age", int)), UserComponent)
+    assert find(param=param("other", str)) is None
+    assert calls == ["user", "token", "age", "other"]
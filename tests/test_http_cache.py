@@ -0,0 +1,144 @@
+import inspect
+
+from sanic.response import json, text
+
+from sanic_boom import Component, ResponseCache
+
+
+class Counter:
+    pass
+
+
+class CounterComponent(Component):
+    calls = 0
+
+    def resolve(self, param: inspect.Parameter) -> bool:
+        return param.annotation is Counter
+
+    async def get(self, request, param: inspect.Parameter):
+        CounterComponent.calls += 1
+        return CounterComponent.calls
+
+
+def test_response_cache(app):
+    CounterComponent.calls = 0
+    app.add_component(CounterComponent)
+    cache = ResponseCache(app, uri="/api", query_params=("page",))
+
+    @app.get("/api/items")
+    async def items_handler(request, counter: Counter):
+        return json({"counter": counter})
+
+    @app.get("/api/private")
+    async def private_handler(request, counter: Counter):
+        return text(str(counter), headers={"Cache-Control": "private"})
+
+    @app.get("/uncached")
+    async def uncached_handler(request, counter: Counter):
+        return text(str(counter))
+
+    request, response = app.test_client.get("/api/items")
+    assert response.status == 200
+    assert response.json == {"counter": 1}
+    etag = response.headers["ETag"]
+
+    # the handler and its components are not called again
+    request, response = app.test_client.get("/api/items?foo=bar")
+    assert response.status == 200
+    assert response.json == {"counter": 1}
+    assert response.headers["ETag"] == etag
+    assert response.headers["Content-Type"] == "application/json"
+
+    request, response = app.test_client.get(
+        "/api/items", headers={"If-None-Match": etag}
+    )
+    assert response.status == 304
+    assert response.text == ""
+
+    # selected query params are part of the key
+    request, response = app.test_client.get("/api/items?page=2")
+    assert response.json == {"counter": 2}
+    request, response = app.test_client.get(
+        "/api/items?page=2", headers={"If-None-Match": 'W/"foo", ' + etag}
+    )
+    assert response.status == 200
+    assert response.json == {"counter": 2}
+
+    assert cache.stats()["entries"] == 2
+    assert cache.invalidate("/api/items") == 2
+    request, response = app.test_client.get("/api/items")
+    assert response.json == {"counter": 3}
+
+    # responses not meant to be stored and routes out of the prefix
+    for uri in ("/api/private", "/api/private", "/uncached", "/uncached"):
+        request, response = app.test_client.get(uri)
+        assert "ETag" not in response.headers
+    assert CounterComponent.calls == 7
+    assert cache.stats()["entries"] == 1
+
+
+def test_response_cache_vary(app):
+    ResponseCache(app, uri="/", vary=("Accept-Language",), ttl=60)
+    calls = []
+
+    @app.get("/hello")
+    async def handler(request):
+        calls.append(1)
+        return text(request.headers.get("Accept-Language", "none"))
+
+    for language in ("en", "pt", "en", "pt"):
+        request, response = app.test_client.get(
+            "/hello", headers={"Accept-Language": language}
+        )
+        assert response.text == language
+        assert response.headers["Vary"] == "Accept-Language"
+
+    assert len(calls) == 2
+
+
+def test_response_cache_authorization(app):
+    cache = ResponseCache(app, uri="/private")
+    shared_cache = ResponseCache(app, uri="/shared", allow_authorized=True)
+    calls = []
+
+    @app.get("/private")
+    async def private_handler(request):
+        calls.append(1)
+        return text(request.headers.get("Authorization", "anonymous"))
+
+    @app.get("/shared")
+    async def shared_handler(request):
+        calls.append(1)
+        return text("shared")
+
+    for token in ("Bearer foo", "Bearer bar"):
+        request, response = app.test_client.get(
+            "/private", headers={"Authorization": token}
+        )
+        assert response.text == token
+        assert "ETag" not in response.headers
+    assert cache.stats()["entries"] == 0
+
+    for token in ("Bearer foo", "Bearer bar"):
+        request, response = app.test_client.get(
+            "/shared", headers={"Authorization": token}
+        )
+        assert response.text == "shared"
+    assert shared_cache.stats()["entries"] == 1
+    assert len(calls) == 3
+
+
+def test_response_cache_layered(app):
+    outer = ResponseCache(app, uri="/api")
+    inner = ResponseCache(app, uri="/api/items", query_params=())
+
+    @app.get("/api/items")
+    async def handler(request):
+        return text("OK")
+
+    request, response = app.test_client.get("/api/items?page=2")
+    assert response.status == 200
+
+    # each cache stores the response under its own key
+    assert ("GET", "/api/items", "page=2", ()) in outer.store
+    assert ("GET", "/api/items", (), ()) in inner.store
@@ -1,4 +1,7 @@
 from sanic.response import text
+from sanic_ipware import get_client_ip
+
+from sanic_boom.proxies import ProxyConfig
 
 
 def test_headers(app):
@@ -48,3 +51,56 @@ def test_headers(app):
 
 def test_no_running_app(sanic_request):
     assert sanic_request.remote_addr is None
+
+
+def test_proxy_config_matches_ipware():
+    class FakeRequest:
+        def __init__(self, headers):
+            self.headers = headers
+
+    cases = [
+        {"X-Forwarded-For": "177.139.233.139, 198.84.193.157"},
+        {"X-Forwarded-For": "192.168.1.1", "X-Real-IP": "127.0.0.1"},
+        {"X-Forwarded-For": "127.0.0.1", "X-Real-IP": "10.0.0.1"},
+        {"X-Forwarded-For": "10.0.0.1", "Forwarded-For": "8.8.8.8"},
+        {"X-Forwarded-For": "unknown, 8.8.8.8", "X-Real-IP": "2001:db8::1"},
+        {"X-Real-IP": "2606:4700::1111", "Via": "224.0.0.1"},
+        {"X-Forwarded-For": " , "},
+        {},
+    ]
+    settings = [
+        {},
+        {"proxy_count": 0},
+        {"proxy_count": 1},
+        {"proxy_trusted_ips": ["198.84.193.157"]},
+    ]
+
+    for headers in cases:
+        for kwargs in settings:
+            expected, _ = get_client_ip(FakeRequest(headers), **kwargs)
+            proxy_config = ProxyConfig(
+                proxy_count=kwargs.get("proxy_count"),
+                trusted_ips=kwargs.get("proxy_trusted_ips"),
+            )
+            assert proxy_config.get_client_ip(headers) == expected
+
+
+def test_trusted_networks(app):
+    app.config.IPWARE_PROXY_TRUSTED_IPS = ["198.84.193.0/24", "10.0."]
+
+    @app.route("/")
+    async def handler(request):
+        assert request.remote_addr is request.remote_addr
+        return text(request.remote_addr or "none")
+
+    for proxy, expected in (
+        ("198.84.193.157", "177.139.233.139"),
+        ("198.84.194.157", "none"),
+        ("10.0.1.2", "177.139.233.139"),
+    ):
+        headers = {"X-Forwarded-For": "177.139.233.139, {}".format(proxy)}
+        request, response = app.test_client.get("/", headers=headers)
+        assert response.text == expected
+
+    assert len(app.proxy_config.trusted_networks) == 1
+    assert app.proxy_config.trusted_prefixes == ("10.0.",)
@@ -1,6 +1,10 @@
+import pytest
 from sanic.exceptions import ServerError
 from sanic.response import text
 
+from sanic_boom import RequestStream
+from sanic_boom.exceptions import UnresolvedParameters
+
 
 def test_sync(app):
     @app.route("/")
@@ -56,3 +60,74 @@ def test_invalid_response(app):
     request, response = app.test_client.get("/")
     assert response.status == 500
     assert response.text == "Internal Server Error."
+
+
+def test_request_stream_injection(app):
+    @app.post("/upload", stream=True)
+    async def upload_handler(body: RequestStream):
+        assert body.high_water == 1024
+        size = 0
+        async for chunk in body:
+            size += len(chunk)
+        return text(str(size))
+
+    app.config.BOOM_STREAM_HIGH_WATER = 1024
+
+    request, response = app.test_client.post("/upload", data="x" * 100000)
+    assert response.status == 200
+    assert response.text == "100000"
+    assert isinstance(request.stream, RequestStream)
+    assert request.stream.buffered == 0
+    assert not request.body
+
+
+def test_request_stream_requires_stream_route(app):
+    @app.post("/not-streamed")
+    async def handler(body: RequestStream):
+        return text("OK")
+
+    with pytest.raises(UnresolvedParameters) as exc_info:
+        app.finalize()
+    assert exc_info.value.unresolved == [
+        (
+            "test_request_stream_requires_stream_route.<locals>.handler "
+            "(not a stream route)",
+            "body",
+        )
+    ]
+
+
+@pytest.mark.asyncio
+async def test_request_stream_flow_control():
+    class FakeTransport:
+        paused = False
+
+        def pause_reading(self):
+            self.paused = True
+
+        def resume_reading(self):
+            self.paused = False
+
+    transport = FakeTransport()
+    stream = RequestStream(transport, high_water=10)
+    assert stream.low_water == 2
+
+    await stream.put(b"x" * 6)
+    assert not transport.paused
+    await stream.put(b"x" * 6)
+    assert transport.paused
+    assert stream.buffered == 12
+
+    await stream.put(None)
+    assert await stream.__anext__() == b"x" * 6
+    assert transport.paused  # 6 bytes are still buffered
+    assert await stream.__anext__() == b"x" * 6
+    assert not transport.paused
+    assert stream.buffered == 0
+
+    for _ in range(2):  # stays exhausted
+        async for chunk in stream:
+            pytest.fail("unexpected chunk {!r}".format(chunk))
+
+    with pytest.raises(ValueError):
+        stream.set_water_marks(10, 11)
@@ -1,10 +1,13 @@
 import pytest
 from sanic.blueprints import Blueprint
 from sanic.constants import HTTP_METHODS
-from sanic.exceptions import URLBuildError
+from sanic.exceptions import MethodNotSupported, NotFound, URLBuildError
 from sanic.response import text
 from sanic.router import RouteExists
 
+from sanic_boom import BoomRouter
+from sanic_boom.router import RouteMiss
+
 
 @pytest.mark.parametrize("method", HTTP_METHODS)
 def test_versioned_routes_get(app, method):
@@ -192,15 +195,39 @@ def test_route_not_found(app):
     assert response.status == 404
 
 
-def test_is_stream_handler_warning(app):
+def test_is_stream_handler(app):
     @app.get("/hello")
     async def handler(request):
-        with pytest.warns(RuntimeWarning):
-            assert request.app.router.is_stream_handler(request) is False
+        assert request.app.router.is_stream_handler(request) is False
         return text("OK")
 
+    @app.post("/upload", stream=True)
+    async def upload_handler(request):
+        assert request.app.router.is_stream_handler(request) is True
+        # the route was matched once, when the headers were complete
+        assert request.route_match is not None
+        assert request.route_match[0].handler is upload_handler
+
+        size = 0
+        while True:
+            body = await request.stream.get()
+            if body is None:
+                break
+            size += len(body)
+        return text(str(size))
+
+    assert app.is_request_stream is True
+
+    # with any streaming route, every route is matched on headers complete
     request, response = app.test_client.get("/hello")
     assert response.status == 200
+    assert request.route_match[0].handler is handler
+
+    request, response = app.test_client.post("/upload", data="x" * 100000)
+    assert response.status == 200
+    assert response.text == "100000"
+    # nothing was buffered
+    assert not request.body
 
 
 def test_layered_middleware(app):  # 47-48
@@ -314,6 +341,40 @@ def test_variable_name_substitution(app):
         app.url_for("handler", command="details", id=20, src="foo:bar")
 
 
+def test_url_for_many(app):
+    app.config.SERVER_NAME = "localhost"
+
+    @app.get("/users/:user_id/posts/:post_id")
+    async def post_handler(request):  # noqa
+        pass
+
+    @app.get("/users")
+    async def users_handler(request):  # noqa
+        pass
+
+    links = [("post_handler", {"user_id": 1, "post_id": i}) for i in range(3)]
+    links.append(("users_handler", {"next": "http://localhost/users"}))
+
+    assert app.url_for_many(links) == [
+        "/users/1/posts/0",
+        "/users/1/posts/1",
+        "/users/1/posts/2",
+        "/users?next=http%3A%2F%2Flocalhost%2Fusers",
+    ]
+    # the given kwargs are left untouched
+    assert links[0][1] == {"user_id": 1, "post_id": 0}
+
+    assert app.url_for_many(links[:1], _external=True, _anchor="top") == [
+        "http://localhost/users/1/posts/0#top"
+    ]
+
+    with pytest.raises(URLBuildError):
+        app.url_for_many([("post_handler", {"user_id": 1})])
+
+    with pytest.raises(ValueError):
+        app.url_for_many(links, _scheme="https")
+
+
 def test_possible_values_on_methods(app):
     @app.route("/", methods=None)
     async def handler(request):
@@ -366,6 +427,29 @@ def test_basic_component_handling(app):
     assert response.status == 200
 
 
+def test_route_parameter_converters(app):
+    class Point:
+        def __init__(self, value):
+            x, y = value.split(",")
+            self.x, self.y = int(x), int(y)
+
+    app.add_converter(Point, Point)
+
+    @app.get("/points/:point/:scale")
+    async def handler(point: Point, scale: float):
+        return text(str((point.x + point.y) * scale))
+
+    request, response = app.test_client.get("/points/1,2/1.5")
+    assert response.status == 200
+    assert response.text == "4.5"
+
+    request, response = app.test_client.get("/points/1,2/foo")
+    assert response.status == 400
+
+    request, response = app.test_client.get("/points/1/1.5")
+    assert response.status == 400
+
+
 def test_url_for_various_arguments(app):
     app.config.SERVER_NAME = "localhost"
 
@@ -395,3 +479,209 @@ def test_url_for_various_arguments(app):
 
     with pytest.raises(ValueError):
         app.url_for("handler", _scheme="https")
+
+
+def test_route_chains(app):
+    @app.middleware
+    async def global_request(request):  # noqa
+        pass
+
+    @app.middleware(attach_to="response")
+    async def global_response(request, response):  # noqa
+        pass
+
+    @app.middleware(uri="/hello")
+    async def layered_request(request):  # noqa
+        pass
+
+    @app.middleware(uri="/hello", attach_to="response")
+    async def layered_response(request, response):  # noqa
+        pass
+
+    @app.get("/hello/:name")
+    async def hello_handler(request):  # noqa
+        pass
+
+    @app.get("/foo")
+    async def foo_handler(request):  # noqa
+        pass
+
+    chains = app.router.build_chains()
+    assert len(chains) == 2
+
+    chain, params = app.router._get("/hello/world", "GET")
+    assert params == {"name": "world"}
+    assert chain.handler is hello_handler
+    assert chain.uri == "/hello/:name"
+    assert chain.request_middlewares == (global_request, layered_request)
+    assert chain.global_response_middlewares == (global_response,)
+    assert chain.response_middlewares == (layered_response,)
+
+    # the very same chain object is reused for every value of "name"
+    assert app.router._get("/hello/there", "GET")[0] is chain
+
+    chain, params = app.router._get("/foo", "GET")
+    assert chain.handler is foo_handler
+    assert chain.request_middlewares == (global_request,)
+    assert chain.global_response_middlewares == (global_response,)
+    assert chain.response_middlewares == ()
+
+
+def test_global_response_middleware_does_not_skip_layered(app):
+    called = []
+
+    @app.middleware(attach_to="response")
+    async def global_response(request, response):
+        called.append("global")
+        return text("global")
+
+    @app.middleware(uri="/hello", attach_to="response")
+    async def layered_response(request, response):
+        called.append("layered")
+
+    @app.get("/hello")
+    async def handler(request):
+        return text("handler")
+
+    request, response = app.test_client.get("/hello")
+
+    assert response.text == "global"
+    assert called == ["global", "layered"]
+
+
+def test_global_request_middleware_skips_layered_response(app):
+    @app.middleware
+    async def global_request(request):
+        return text("blocked by global")
+
+    @app.middleware(uri="/hello", attach_to="response")
+    async def layered_response(request, response):
+        return text("rewritten by layered")
+
+    @app.get("/hello")
+    async def handler(request):
+        return text("handler")
+
+    request, response = app.test_client.get("/hello")
+
+    assert response.text == "blocked by global"
+
+
+def test_global_middleware_on_not_found(app):
+    @app.middleware
+    async def request_middleware(request):
+        return text("OK from middleware")
+
+    request, response = app.test_client.get("/not/found")
+    assert response.status == 200
+    assert response.text == "OK from middleware"
+
+
+def test_two_tier_lookup():
+    router = BoomRouter(cache_size=2)
+
+    async def static_handler(request):  # noqa
+        pass
+
+    async def dynamic_handler(request, user_id):  # noqa
+        pass
+
+    router.add("/users", ["GET"], static_handler)
+    router.add("/users/:user_id", ["GET"], dynamic_handler)
+
+    chain, params = router._get("/users/", "GET")
+    assert chain.handler is static_handler
+    assert params == {}
+
+    # static routes never touch the dynamic cache
+    assert router.cache_info()["dynamic"]["misses"] == 0
+    assert router.cache_info()["static_routes"] == 1
+
+    chain, params = router._get("/users/1", "GET")
+    assert chain.handler is dynamic_handler
+    assert params == {"user_id": "1"}
+
+    assert router._get("/users/1", "GET")[1] == {"user_id": "1"}
+    router._get("/users/2", "GET")
+    router._get("/users/3", "GET")
+
+    stats = router.cache_info()["dynamic"]
+    assert stats["hits"] == 1
+    assert stats["misses"] == 3
+    assert stats["entries"] == 2
+    assert stats["evictions"] == 1
+
+    # the static route is still there for other methods
+    with pytest.raises(MethodNotSupported):
+        router._get("/users", "POST")
+
+
+def test_route_misses(app):
+    @app.get("/users/:user_id")
+    async def handler(request, user_id):
+        return text(user_id)
+
+    request, response = app.test_client.get("/wp-login.php")
+    assert response.status == 404
+    assert response.text == "Error: Not Found"
+
+    # the test client has an error handler of its own for this one
+    request, response = app.test_client.put("/users/1")
+    assert response.status == 405
+    assert response.headers["Allow"] == "GET"
+    assert app._prebuilt_misses == {404}
+
+    response = app.router.match(request).response()
+    assert response.status == 405
+    assert response.headers["Allow"] == "GET"
+    assert response.body == b"Error: Method Not Allowed"
+
+    miss = app.router.match(request)
+    assert isinstance(miss, RouteMiss)
+    assert miss.allowed_methods == {"GET"}
+    # misses are cached
+    assert app.router.match(request) is miss
+    assert app.router.cache_info()["missing"]["entries"] == 1
+
+    with pytest.raises(MethodNotSupported):
+        app.router.get(request)
+
+
+def test_prebuilt_misses(app):
+    @app.get("/")
+    async def handler(request):
+        return text("OK")
+
+    app.finalize()
+    assert app._prebuilt_miss(404)
+    assert app._prebuilt_miss(405)
+
+    # the default error handler shows more in debug mode
+    app.debug = True
+    assert not app._prebuilt_miss(404)
+    app.debug = False
+
+    # a handler added after finalizing still gets its errors
+    @app.exception(NotFound)
+    def not_found(request, exception):
+        return text("custom", status=404)
+
+    assert not app._prebuilt_miss(404)
+    assert app._prebuilt_miss(405)
+
+    request, response = app.test_client.get("/wp-login.php")
+    assert response.text == "custom"
+
+
+def test_route_misses_with_handlers(app):
+    @app.exception(NotFound)
+    def not_found(request, exception):
+        return text("nothing to see here", status=404)
+
+    @app.get("/hello")
+    async def handler(request):  # noqa
+        pass
+
+    request, response = app.test_client.get("/wp-login.php")
+    assert response.status == 404
+    assert response.text == "nothing to see here"
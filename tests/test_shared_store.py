@@ -0,0 +1,194 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from sanic_boom.shared_store import SharedMemoryStore
+from sanic_boom.store import MISSING
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+requires_fork = pytest.mark.skipif(
+    not hasattr(os, "fork"), reason="requires os.fork"
+)
+requires_fcntl = pytest.mark.skipif(fcntl is None, reason="requires fcntl")
+
+
+def test_lookup():
+    store = SharedMemoryStore(size=1024, slots=16)
+
+    assert store.lookup("foo") is MISSING
+
+    store["foo"] = {"bar": [1, 2, 3]}
+
+    assert store.lookup("foo") == {"bar": [1, 2, 3]}
+    assert "foo" in store
+    assert len(store) == 1
+    assert store.stats()["hits"] == 1
+    assert store.stats()["misses"] == 1
+
+    del store["foo"]
+
+    assert "foo" not in store
+    assert store.get("foo") is None
+
+
+@requires_fork
+def test_shared_among_forked_processes():
+    store = SharedMemoryStore(size=1024, slots=16)
+
+    pid = os.fork()
+    if pid == 0:  # pragma: no cover
+        store["foo"] = "computed by the child"
+        os._exit(0)
+    os.waitpid(pid, 0)
+
+    assert store["foo"] == "computed by the child"
+
+
+@requires_fcntl
+def test_shared_by_path(tmpdir):
+    path = str(tmpdir.join("boom.shm"))
+    store = SharedMemoryStore(size=1024, slots=16, path=path)
+    # the geometry of the existing segment is used
+    other = SharedMemoryStore(size=4096, slots=64, path=path)
+
+    store.set("foo", "bar")
+
+    assert other.data_size == 1024
+    assert other["foo"] == "bar"
+    assert other.invalidate() == 1
+    assert store.get("foo") is None
+
+    store.close()
+    other.close()
+
+
+@requires_fork
+@requires_fcntl
+def test_file_lock_excludes_forked_processes(tmpdir):
+    store = SharedMemoryStore(size=1024, slots=16, path=str(tmpdir.join("x")))
+
+    with store._lock:
+        pid = os.fork()
+        if pid == 0:  # pragma: no cover
+            try:
+                fcntl.lockf(store._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                os._exit(0)  # held by the parent, as it should
+            os._exit(1)
+        _, status = os.waitpid(pid, 0)
+
+    assert os.WEXITSTATUS(status) == 0
+    store.close()
+
+
+@requires_fcntl
+def test_untrusted_files_are_refused(tmpdir):
+    path = str(tmpdir.join("boom.shm"))
+    SharedMemoryStore(size=1024, slots=16, path=path).close()
+
+    os.chmod(path, 0o666)
+    with pytest.raises(PermissionError):
+        SharedMemoryStore(path=path)
+
+    os.chmod(path, 0o600)
+    link = str(tmpdir.join("link.shm"))
+    os.symlink(path, link)
+    with pytest.raises(OSError):
+        SharedMemoryStore(path=link)
+
+    with open(path, "r+b") as handle:
+        handle.truncate(64)
+    with pytest.raises(ValueError):
+        SharedMemoryStore(path=path)
+
+
+def test_ttl_and_full_segment():
+    store = SharedMemoryStore(size=64, slots=4, ttl=0.05)
+    store["foo"] = "bar"
+    store.set("baz", "qux", ttl=60)
+
+    time.sleep(0.1)
+
+    assert store.lookup("foo") is MISSING
+    assert store.lookup("baz") == "qux"
+    assert store.stats()["expirations"] == 1
+
+    # the oldest values are dropped when the data area is full
+    store["big"] = "x" * 40
+    store["bigger"] = "y" * 40
+
+    assert store.get("big") is None
+    assert store["bigger"] == "y" * 40
+    assert store.stats()["evictions"] == 2
+
+
+def test_compaction():
+    store = SharedMemoryStore(size=110, slots=8)
+    store.set("foo", "x" * 20, ttl=0.05)
+    store["bar"] = "y" * 20
+    store["baz"] = "z" * 20
+
+    time.sleep(0.1)
+
+    # only the expired value is dropped to make room
+    store["qux"] = "w" * 20
+
+    assert store["bar"] == "y" * 20
+    assert store["baz"] == "z" * 20
+    assert store["qux"] == "w" * 20
+    assert store.stats()["evictions"] == 0
+
+    # and then the oldest ones
+    store["big"] = "v" * 20
+
+    assert store.get("bar") is None
+    assert store["baz"] == "z" * 20
+    assert store["big"] == "v" * 20
+    assert store.stats()["evictions"] == 1
+
+
+@requires_fork
+def test_decoded_values_are_kept():
+    store = SharedMemoryStore(size=1024, slots=16)
+    store["foo"] = {"bar": [1, 2, 3]}
+
+    value = store["foo"]
+    assert store["foo"] is value
+
+    pid = os.fork()
+    if pid == 0:  # pragma: no cover
+        store["foo"] = {"bar": [4, 5, 6]}
+        os._exit(0)
+    os.waitpid(pid, 0)
+
+    # the slot changed, so it's decoded again
+    assert store["foo"] == {"bar": [4, 5, 6]}
+    assert store["foo"] is store["foo"]
+
+
+def test_unpicklable_values_stay_local():
+    loop = asyncio.new_event_loop()
+    future = loop.create_future()
+    store = SharedMemoryStore(size=1024, slots=16)
+
+    store["foo"] = future
+
+    assert store["foo"] is future
+    assert len(store.local) == 1
+
+    store["foo"] = "bar"
+
+    assert len(store.local) == 0
+    assert store["foo"] == "bar"
+
+    store["foo"] = future
+
+    assert store.invalidate(lambda key: key == "foo") == 2
+    assert "foo" not in store
+    loop.close()
@@ -0,0 +1,117 @@
+import sys
+import time
+
+from sanic_boom.store import MISSING, MemoryStore, deep_sizeof
+
+
+def test_lookup():
+    store = MemoryStore(max_bytes=1024)
+
+    assert store.lookup("foo") is MISSING
+
+    store["foo"] = "bar"
+
+    assert store.lookup("foo") == "bar"
+    assert "foo" in store
+    assert store.stats() == {
+        "entries": 1,
+        "size": sys.getsizeof("bar"),
+        "hits": 1,
+        "misses": 1,
+        "evictions": 0,
+        "expirations": 0,
+    }
+
+    del store["foo"]
+
+    assert "foo" not in store
+    assert store.get("foo") is None
+
+
+def test_lru_eviction():
+    store = MemoryStore(max_entries=2)
+    store["foo"] = 1
+    store["bar"] = 2
+
+    # "foo" is now the most recently used
+    assert store.lookup("foo") == 1
+
+    store["baz"] = 3
+
+    assert list(store) == ["foo", "baz"]
+    assert store.stats()["evictions"] == 1
+
+
+def test_size_eviction():
+    store = MemoryStore(max_bytes=10, sizeof=len)
+    store["foo"] = "12345"
+    store["bar"] = "12345"
+
+    assert store.size == 10
+
+    store["foo"] = "1234"
+
+    assert store.size == 9
+    assert list(store) == ["bar", "foo"]
+
+    store["baz"] = "123"
+
+    assert list(store) == ["foo", "baz"]
+    assert store.size == 7
+    assert store.stats()["evictions"] == 1
+
+
+def test_ttl():
+    store = MemoryStore(ttl=0.05)
+    store["foo"] = 1
+    store.set("bar", 2, ttl=60)
+
+    assert store.lookup("foo") == 1
+
+    time.sleep(0.1)
+
+    assert store.lookup("foo") is MISSING
+    assert store.lookup("bar") == 2
+    assert store.values() == [2]
+    assert store.stats()["expirations"] == 1
+
+
+def test_invalidate():
+    store = MemoryStore()
+    store[("a", 1)] = 1
+    store[("a", 2)] = 2
+    store[("b", 1)] = 3
+
+    assert store.invalidate(lambda key: key[0] == "a") == 2
+    assert list(store) == [("b", 1)]
+    assert store.invalidate() == 1
+    assert len(store) == 0
+
+
+def test_deep_sizeof():
+    class Holder:
+        def __init__(self, value):
+            self.value = value
+
+    payload = "x" * 1000
+    assert deep_sizeof(payload) == sys.getsizeof(payload)
+    assert deep_sizeof([payload]) > sys.getsizeof([payload]) + 1000
+    assert deep_sizeof({"key": payload}) > 1000
+    assert deep_sizeof(Holder(payload)) > 1000
+    # what the attributes of instances hold is not counted
+    assert deep_sizeof(Holder([payload])) < 1000
+    # each object is counted once
+    assert deep_sizeof([payload, payload]) < deep_sizeof([payload]) + 1000
+
+
+def test_size_without_max_bytes():
+    sizes = []
+
+    def sizeof(value):
+        sizes.append(value)
+        return 1
+
+    store = MemoryStore(sizeof=sizeof)
+    store["foo"] = "bar"
+    assert sizes == []
+    assert store.stats()["size"] == 0
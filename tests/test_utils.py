@@ -1,6 +1,12 @@
 import inspect
+import typing as t
+import uuid
+from enum import Enum, IntEnum
+
+import pytest
 
 from sanic_boom import param_parser
+from sanic_boom.converters import ConverterRegistry
 
 
 def test_int():
@@ -62,3 +68,33 @@ def test_empty():
     assert myfunc("foo") == param_parser("foo", value_param)
     assert myfunc(20) == param_parser(20, value_param)
     assert myfunc(True) == param_parser(True, value_param)
+
+
+def test_converter_registry():
+    class Color(Enum):
+        RED = "red"
+
+    class Level(IntEnum):
+        LOW = 1
+
+    registry = ConverterRegistry()
+    empty = inspect.Parameter.empty
+
+    assert registry.find(empty) is None
+    assert registry.find(str) is None
+    assert registry.find(t.List[int]) is None
+    assert registry.find(int)("20") == 20
+    assert registry.find(bool)("Yes") is True
+    assert registry.find(uuid.UUID)(
+        "12345678123456781234567812345678"
+    ) == uuid.UUID("12345678123456781234567812345678")
+
+    assert registry.find(Color)("red") is Color.RED
+    assert registry.find(Color)("RED") is Color.RED
+    assert registry.find(Level)("1") is Level.LOW
+    assert registry.find(Level)("LOW") is Level.LOW
+    with pytest.raises(ValueError):
+        registry.find(Level)("2")
+
+    registry.register(Color, lambda value: "custom")
+    assert registry.find(Color)("red") == "custom"